@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class SearchCancelled(Exception):
+    pass
+
+
+class BackgroundSearch:
+    DEBOUNCE_MS = 150
+    POLL_MS = 15
+
+    def __init__(self, root, debounce_ms=DEBOUNCE_MS, on_error=None):
+        self.root = root
+        self.debounce_ms = debounce_ms
+        # Called on the Tk thread with whatever a search or task raised, unless the caller passed its own
+        self.on_error = on_error
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.pending = None
+        self.cancelled = None
+
+    def submit(self, search, on_result, debounce=True, on_error=None):
+        # search(cancelled) runs on the worker thread and must not touch Tk; on_result and on_error run on the Tk thread
+        self.cancel()
+        self.pending = self.root.after(self.debounce_ms if debounce else 0, self.start, search, on_result, on_error)
+
+    def start(self, search, on_result, on_error):
+        self.pending = None
+        cancelled = threading.Event()
+        self.cancelled = cancelled
+        future = self.executor.submit(search, cancelled)
+        self.root.after(self.POLL_MS, self.deliver, future, cancelled, on_result, on_error)
+
+    def run(self, task, on_result, on_error=None):
+        # Other work that must stay off the Tk thread, such as loading: it queues on the same worker, so it
+        # never waits on a search for the service lock, and a newer search does not cancel it
+        future = self.executor.submit(task)
+        self.root.after(self.POLL_MS, self.deliver, future, threading.Event(), on_result, on_error)
+
+    def deliver(self, future, cancelled, on_result, on_error):
+        if cancelled.is_set():
+            return
+        if not future.done():
+            self.root.after(self.POLL_MS, self.deliver, future, cancelled, on_result, on_error)
+            return
+        try:
+            result = future.result()
+        except SearchCancelled:
+            return
+        except Exception as e:
+            on_error = on_error or self.on_error
+            if on_error is None:
+                raise
+            on_error(e)
+            return
+        on_result(result)
+
+    def cancel(self):
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.pending = None
+        if self.cancelled is not None:
+            self.cancelled.set()
+            self.cancelled = None
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,73 @@
+import argparse
+import json
+import os
+import random
+from datetime import date, timedelta
+from library_module import Book
+from library_file_handler import atomic_write_lines
+
+WORDS = ["Війна", "мир", "Гаррі", "Поттер", "Майстер", "Маргарита", "Тихий", "Дон", "Анна", "Кареніна",
+         "Кобзар", "Лісова", "пісня", "Тіні", "забутих", "предків", "Злочин", "кара", "Мертві", "душі",
+         "War", "Peace", "Master", "Silent", "River", "Night", "Garden", "Shadow", "Kingdom", "Letters",
+         "Pride", "Prejudice", "Winter", "Stone", "Crime", "Punishment", "Island", "Secret", "History", "Sea"]
+AUTHORS = ["Лев Толстой", "Джоан Роулінг", "Михайло Булгаков", "Михайло Шолохов", "Тарас Шевченко", "Леся Українка",
+           "Михайло Коцюбинський", "Федір Достоєвський", "Микола Гоголь", "Leo Tolstoy", "Jane Austen",
+           "Charles Dickens", "Mark Twain", "Virginia Woolf", "Ernest Hemingway", "Agatha Christie"]
+FIRST_NAMES = ["Олена", "Андрій", "Марія", "Тарас", "Оксана", "Дмитро", "Ірина", "Богдан", "Наталія", "Сергій",
+               "John", "Jane", "Anna", "Peter", "Maria", "David", "Emma", "Lucas"]
+LAST_NAMES = ["Шевченко", "Коваленко", "Бондаренко", "Ткаченко", "Кравченко", "Олійник", "Мельник", "Поліщук",
+              "Smith", "Doe", "Brown", "Müller", "Novak", "Kowalski"]
+GROUPS = ["КН-21", "КН-22", "ПІ-21", "ПІ-22", "ФІ-31", "МА-11", "Group A", "Group B", "CS-101", "CS-102"]
+# Most students hold nothing or one or two books; a few hold many
+LOAN_COUNT_WEIGHTS = [40, 30, 15, 8, 4, 2, 1]
+REFERENCE_DATE = date(2024, 6, 1)
+
+
+def generate_title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4)))
+
+def generate_books(count, seed=0):
+    rng = random.Random(seed)
+    return [Book(i, generate_title(rng), rng.choice(AUTHORS), rng.randint(1800, 2024), rng.randint(0, 10))
+            for i in range(1, count + 1)]
+
+def book_lines(count, seed=0):
+    rng = random.Random(seed)
+    for book_id in range(1, count + 1):
+        yield f"{book_id} | {generate_title(rng)} | {rng.choice(AUTHORS)} | {rng.randint(1800, 2024)} | {rng.randint(0, 10)}"
+
+def card_lines(count, book_count, seed=0, today=REFERENCE_DATE):
+    # Due dates fall in the two months either side of `today`, so roughly half of the loans are overdue
+    rng = random.Random(seed + 1)
+    loan_counts = range(len(LOAN_COUNT_WEIGHTS))
+    for card_id in range(1, count + 1):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        issue_date = today - timedelta(days=rng.randint(0, 4 * 365))
+        loans = [{str(rng.randint(1, book_count)): (today + timedelta(days=rng.randint(-60, 60))).isoformat()}
+                 for _ in range(rng.choices(loan_counts, LOAN_COUNT_WEIGHTS)[0])]
+        yield f"{card_id} | {name} | {issue_date.isoformat()} | {rng.choice(GROUPS)} | {json.dumps(loans)}"
+
+def generate_catalog(directory, rows, seed=0, today=REFERENCE_DATE):
+    # Files are named by size and seed and reused when present, since the larger ones take a while to write
+    os.makedirs(directory, exist_ok=True)
+    books_filename = os.path.join(directory, f"books-{rows}-{seed}.txt")
+    cards_filename = os.path.join(directory, f"students-{rows}-{seed}.txt")
+    if not os.path.exists(books_filename):
+        atomic_write_lines(books_filename, book_lines(rows, seed))
+    if not os.path.exists(cards_filename):
+        atomic_write_lines(cards_filename, card_lines(rows, rows, seed, today))
+    return books_filename, cards_filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic books.txt/students.txt pair")
+    parser.add_argument("rows", type=int, help="number of books and of student cards")
+    parser.add_argument("--directory", default="benchmark-data")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for filename in generate_catalog(args.directory, args.rows, args.seed):
+        print(f"{filename}: {os.path.getsize(filename) / (1024 * 1024):.1f} MB")
+
+if __name__ == "__main__":
+    main()
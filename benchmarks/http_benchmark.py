@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from library_client import LibraryClient
+from library_file_handler import TextFileBackend, write_books_to_file, write_student_cards_to_file
+from library_server import LibraryServer
+from library_service import LibraryService
+from benchmarks.catalog_generator import generate_books, WORDS
+
+def start_server(books, workers):
+    directory = tempfile.mkdtemp()
+    books_filename = os.path.join(directory, "books.txt")
+    cards_filename = os.path.join(directory, "students.txt")
+    write_books_to_file(books_filename, books)
+    write_student_cards_to_file(cards_filename, [])
+    service = LibraryService(TextFileBackend(books_filename, cards_filename))
+    service.load_all()
+
+    ready = threading.Event()
+    ports = []
+    def on_ready(port):
+        ports.append(port)
+        ready.set()
+    server = LibraryServer(service, workers)
+    threading.Thread(target=lambda: asyncio.run(server.serve("127.0.0.1", 0, on_ready)), daemon=True).start()
+    ready.wait()
+    return f"http://127.0.0.1:{ports[0]}"
+
+def run_client(url, requests, seed, latencies):
+    client = LibraryClient(url)
+    rng = random.Random(seed)
+    for _ in range(requests):
+        term = rng.choice(WORDS).lower()[:rng.randint(2, 5)]
+        start = time.perf_counter()
+        client.request("GET", "/books", {"field": "title", "term": term, "limit": 20})
+        latencies.append(time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure requests per second and latency of library_server title searches")
+    parser.add_argument("--url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="requests per client")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    url = args.url or start_server(generate_books(args.books), args.workers)
+    latencies = []
+    threads = [threading.Thread(target=run_client, args=(url, args.requests, seed, latencies)) for seed in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.2f}s: {len(latencies) / elapsed:.0f} req/s")
+    print(f"Latency p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import argparse
+import os
+import tempfile
+import time
+from library_bulk import parse_file
+from library_file_handler import write_books_to_file
+from benchmarks.catalog_generator import generate_books
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bulk import parse throughput in MB/s for increasing worker counts")
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    filename = os.path.join(tempfile.mkdtemp(), "books.txt")
+    write_books_to_file(filename, generate_books(args.books))
+    megabytes = os.path.getsize(filename) / (1024 * 1024)
+    print(f"{args.books} books, {megabytes:.1f} MB")
+
+    workers = 1
+    while workers <= args.max_workers:
+        start = time.perf_counter()
+        count = sum(len(records) for records, _ in parse_file(filename, "books", workers))
+        elapsed = time.perf_counter() - start
+        print(f"{workers} workers: {count} records in {elapsed:.2f}s, {megabytes / elapsed:.1f} MB/s")
+        workers *= 2
+    os.remove(filename)
+
+if __name__ == "__main__":
+    main()
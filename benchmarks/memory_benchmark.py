@@ -0,0 +1,84 @@
+import argparse
+import json
+import tracemalloc
+from library_module import Book, StudentCard
+from library_columns import BookColumns, CardColumns
+from benchmarks.catalog_generator import generate_books
+
+
+class LegacyBook:
+    # The model as it was before __slots__: one instance dict per record
+    def __init__(self, id, title, author, year, quantity):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.year = year
+        self.quantity = quantity
+
+    @staticmethod
+    def from_string(book_str):
+        parts = book_str.strip().split(" | ")
+        return LegacyBook(int(parts[0]), parts[1], parts[2], int(parts[3]), int(parts[4]))
+
+
+class LegacyStudentCard:
+    def __init__(self, id, title, student_name, issue_date, group, borrowed_books):
+        self.id = id
+        self.title = title
+        self.student_name = student_name
+        self.issue_date = issue_date
+        self.group = group
+        self.borrowed_books = borrowed_books
+
+    @staticmethod
+    def from_string(card_str):
+        parts = card_str.strip().split(" | ")
+        return LegacyStudentCard(int(parts[0]), "Student Card", parts[1], parts[2], parts[3], json.loads(parts[4]))
+
+
+def generate_card_lines(count, book_count):
+    return [f"{i} | Student {i} | 2024-04-{i % 28 + 1:02d} | Group {i % 40} | "
+            + json.dumps([{str((i * 7 + j) % book_count + 1): f"2024-{j % 12 + 1:02d}-15"} for j in range(i % 4)])
+            for i in range(1, count + 1)]
+
+def measure(build, lines):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(lines)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return used / len(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Report bytes per record for each model representation")
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    book_lines = [book.to_string() for book in generate_books(args.records)]
+    card_lines = generate_card_lines(args.records, args.records)
+
+    def loaded_cards(lines):
+        cards = [StudentCard.from_string(line) for line in lines]
+        for card in cards:
+            card.loans
+        return cards
+
+    results = {
+        "books": {
+            "dict objects": measure(lambda lines: [LegacyBook.from_string(line) for line in lines], book_lines),
+            "slotted objects": measure(lambda lines: [Book.from_string(line) for line in lines], book_lines),
+            "columns": measure(lambda lines: BookColumns(Book.from_string(line) for line in lines), book_lines),
+        },
+        "cards": {
+            "dict objects": measure(lambda lines: [LegacyStudentCard.from_string(line) for line in lines], card_lines),
+            "slotted objects": measure(loaded_cards, card_lines),
+            "columns": measure(lambda lines: CardColumns(StudentCard.from_string(line) for line in lines), card_lines),
+        },
+    }
+    for kind, sizes in results.items():
+        for representation, size in sizes.items():
+            print(f"{kind:6} {representation:16} {size:8.1f} bytes/record")
+
+if __name__ == "__main__":
+    main()
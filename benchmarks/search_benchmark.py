@@ -0,0 +1,39 @@
+import argparse
+import time
+from benchmarks.catalog_generator import generate_books
+from library_search import book_search_index
+from transliteration import normalize
+
+def scan_search(books, search_term):
+    # Matches on the same search keys as the index, so the two return the same books
+    search_term = normalize(search_term)
+    return [book for book in books if search_term in normalize(book.title)]
+
+def index_search(books_by_id, index, search_term):
+    return [books_by_id[book_id] for book_id in sorted(index.search("title", search_term))]
+
+def time_keystrokes(search, query):
+    start = time.perf_counter()
+    for length in range(1, len(query) + 1):
+        search(query[:length].lower())
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list scans with the n-gram index while typing a query")
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--query", default="маргарита")
+    args = parser.parse_args()
+
+    books = generate_books(args.books)
+    books_by_id = {book.id: book for book in books}
+    start = time.perf_counter()
+    index = book_search_index(books)
+    print(f"Index build for {len(books)} books: {time.perf_counter() - start:.3f}s")
+
+    assert scan_search(books, args.query.lower()) == index_search(books_by_id, index, args.query.lower())
+    scan_time = time_keystrokes(lambda term: scan_search(books, term), args.query)
+    index_time = time_keystrokes(lambda term: index_search(books_by_id, index, term), args.query)
+    print(f"Typing {args.query!r}: scan {scan_time:.3f}s, index {index_time:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from library_file_handler import TextFileBackend, read_books_from_file, read_student_cards_from_file, write_books_to_file, write_student_cards_to_file
+from render_cache import RenderCache, card_row, card_references
+from benchmarks.catalog_generator import generate_catalog, REFERENCE_DATE
+
+BOOK_SEARCHES = [("title", "ма"), ("title", "маргарита"), ("title", "war"), ("author", "толст"), ("year", "1969")]
+CARD_SEARCHES = [("name", "ол"), ("name", "шевченко"), ("group", "кн-2")]
+FUZZY_BOOK_SEARCHES = [("title", "margarita"), ("title", "mragarita"), ("title", "voina i mir"), ("author", "tolstoy")]
+PAGE_ROWS = 20
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def time_operation(operation, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = operation()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+def format_cards(backend, cards):
+    # The listbox row text the GUI shows
+    return [card_row(card, backend.borrowed_books_info(card)) for card in cards]
+
+def run_size(rows, directory, seed, repeat):
+    books_filename, cards_filename = generate_catalog(directory, rows, seed)
+    output_directory = tempfile.mkdtemp()
+    results = []
+
+    def measure(name, operation, times=repeat):
+        seconds, result = time_operation(operation, times)
+        count = len(result) if hasattr(result, '__len__') else None
+        results.append({"rows": rows, "operation": name, "repeat": times, "min": min(seconds),
+                        "median": statistics.median(seconds), "result_count": count})
+        print(f"{rows:>9} {name:<48} min {min(seconds) * 1000:10.2f}ms  median {statistics.median(seconds) * 1000:10.2f}ms", file=sys.stderr)
+        return result
+
+    books = measure("parse_books", lambda: read_books_from_file(books_filename))
+    cards = measure("parse_cards", lambda: read_student_cards_from_file(cards_filename))
+    measure("decode_loans", lambda: [card.loans for card in cards], 1)
+    measure("write_books", lambda: write_books_to_file(os.path.join(output_directory, "books.txt"), books))
+    measure("write_cards", lambda: write_student_cards_to_file(os.path.join(output_directory, "students.txt"), cards))
+    del books, cards
+
+    backend = measure("load_text_backend", lambda: TextFileBackend(books_filename, cards_filename).load_all(), 1)
+    try:
+        for field, term in BOOK_SEARCHES:
+            measure(f"search_books[{field}={term}]", lambda: backend.search_books(field, term))
+        measure("search_books[title=ма,year=1900-1950,in_stock,sort=title]",
+                lambda: backend.search_books("title", "ма", None, (1900, 1950), True, "title"))
+        for field, term in FUZZY_BOOK_SEARCHES:
+            measure(f"search_books[{field}~{term}]", lambda: backend.search_books(field, term, fuzzy=True))
+        measure("search_books[all,sort=year]", lambda: backend.search_books("title", "", None, sort_by="year"))
+        for field, term in CARD_SEARCHES:
+            measure(f"search_cards[{field}={term}]", lambda: backend.search_cards(field, term))
+        overdue = measure("overdue_cards", lambda: backend.overdue_cards(REFERENCE_DATE))
+        measure("cards_due_within[7]", lambda: backend.cards_due_within(7, REFERENCE_DATE))
+        measure("outstanding_loans[all books]", lambda: [backend.outstanding_loans(book.id) for book in backend.all_books()], 1)
+        measure("top_borrowed[10]", lambda: backend.top_borrowed(10))
+        measure("group_stats", lambda: backend.group_stats())
+        measure("format_cards_page", lambda: format_cards(backend, overdue[:PAGE_ROWS]))
+        measure("format_cards_all_overdue", lambda: format_cards(backend, overdue), 1)
+        card_rows = RenderCache(lambda card: card_row(card, backend.borrowed_books_info(card)), card_references)
+        measure("format_cards_all_overdue_cached", lambda: [card_rows.get(card) for card in overdue])
+    finally:
+        backend.close()
+    for filename in os.listdir(output_directory):
+        os.remove(os.path.join(output_directory, filename))
+    os.rmdir(output_directory)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the catalog hot paths on synthetic data and write the results as JSON")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="catalog sizes, up to 10000000")
+    parser.add_argument("--directory", default="benchmark-data", help="where generated catalogs are kept between runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    report = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+              "seed": args.seed, "reference_date": REFERENCE_DATE.isoformat(), "results": []}
+    for rows in args.rows:
+        report["results"] += run_size(rows, args.directory, args.seed, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
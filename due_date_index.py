@@ -0,0 +1,63 @@
+import bisect
+from datetime import timedelta
+from instrumentation import instrumented
+
+class DueDateIndex:
+    def __init__(self, cards=None):
+        # Sorted (due date ordinal, card id, book id) entries, one per loan
+        self.entries = []
+        self.pending = []
+        self.card_entries = {}
+        self.add_many(cards or [])
+
+    def entries_for(self, card):
+        return [(loan.due_date.toordinal(), card.id, loan.book_id) for loan in card.loans]
+
+    def add_many(self, cards, defer=False):
+        # Deferred entries are held back from queries until flush(), so bulk loads sort once
+        for card in cards:
+            self.card_entries[card.id] = self.entries_for(card)
+            self.pending.extend(self.card_entries[card.id])
+        if not defer:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        # Sorted into a new list and swapped in, so a search thread never sees a half-sorted list
+        entries = self.entries + self.pending
+        entries.sort()
+        self.entries = entries
+        self.pending = []
+
+    def add(self, card):
+        self.flush()
+        entries = self.entries_for(card)
+        self.card_entries[card.id] = entries
+        for entry in entries:
+            bisect.insort(self.entries, entry)
+
+    def remove(self, card_id):
+        self.flush()
+        for entry in self.card_entries.pop(card_id, ()):
+            del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def update(self, card):
+        self.remove(card.id)
+        self.add(card)
+
+    def due_between(self, start, end):
+        entries = self.entries
+        low = bisect.bisect_left(entries, (start.toordinal(),))
+        high = bisect.bisect_left(entries, (end.toordinal(),))
+        return list(dict.fromkeys(card_id for _, card_id, _ in entries[low:high]))
+
+    @instrumented("due_index.overdue")
+    def overdue(self, as_of):
+        entries = self.entries
+        high = bisect.bisect_left(entries, (as_of.toordinal(),))
+        return list(dict.fromkeys(card_id for _, card_id, _ in entries[:high]))
+
+    @instrumented("due_index.due_within")
+    def due_within(self, days, today):
+        return self.due_between(today, today + timedelta(days=days + 1))
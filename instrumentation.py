@@ -0,0 +1,149 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Read once at import: when disabled, `instrumented` hands back the undecorated function and
+# `span`/`count` are no-ops, so an uninstrumented run pays nothing in the hot paths
+ENABLED = os.environ.get("LIBRARY_INSTRUMENT", "") not in ("", "0")
+DUMP_FILENAME = os.environ.get("LIBRARY_INSTRUMENT_DUMP")
+DUMP_INTERVAL = float(os.environ.get("LIBRARY_INSTRUMENT_INTERVAL", "10"))
+SPAN_HISTORY = 1000
+
+
+class Histogram:
+    # Durations bucketed by powers of two microseconds, so percentiles are upper bounds within 2x
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = {}
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        bucket = int(seconds * 1000000).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction):
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= fraction * self.count:
+                return min((1 << bucket) / 1000000, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.0,
+                "min": self.min or 0.0, "max": self.max,
+                "p50": self.percentile(0.5), "p90": self.percentile(0.9), "p99": self.percentile(0.99)}
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.counters = {}
+            self.histograms = {}
+            self.spans = deque(maxlen=SPAN_HISTORY)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def span(self, name):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self.observe(name, duration)
+            with self.lock:
+                self.spans.append({"name": name, "parent": parent, "thread": threading.current_thread().name,
+                                   "start": start, "duration": duration})
+
+    def snapshot(self):
+        with self.lock:
+            return {"started": self.started, "time": time.time(), "counters": dict(self.counters),
+                    "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+                    "spans": list(self.spans)}
+
+    def dump(self, filename):
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file, indent=2, ensure_ascii=False)
+        os.replace(tmp_filename, filename)
+
+
+metrics = Metrics()
+
+if ENABLED:
+    def instrumented(name):
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with metrics.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def span(name):
+        return metrics.span(name)
+
+    def count(name, amount=1):
+        metrics.count(name, amount)
+else:
+    NULL_SPAN = nullcontext()
+
+    def instrumented(name):
+        return lambda function: function
+
+    def span(name):
+        return NULL_SPAN
+
+    def count(name, amount=1):
+        pass
+
+
+def start_periodic_dump(filename=DUMP_FILENAME, interval=DUMP_INTERVAL):
+    if not ENABLED or not filename:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                metrics.dump(filename)
+            except OSError as e:
+                print(f"Could not write metrics to {filename}: {e}")
+
+    thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,164 @@
+import argparse
+import mmap
+import os
+import struct
+from library_module import Book, StudentCard
+from library_file_handler import iter_records_from_file, atomic_write_lines
+
+# File layout: header | fixed-width records in file order | (id, position) index sorted by id | string table
+MAGIC = b'LBC1'
+HEADER = struct.Struct('<4sBxxxIQQQ')
+INDEX_ENTRY = struct.Struct('<iI')
+
+
+class BinaryLayout:
+    def __init__(self, kind, number_format, string_count, numbers, strings, parse, build):
+        self.kind = kind
+        # Numbers are stored inline; each string is an (offset, length) pair into the string table
+        self.record = struct.Struct('<' + number_format + 'II' * string_count)
+        self.number_count = len(number_format)
+        self.numbers = numbers
+        self.strings = strings
+        self.parse = parse
+        self.build = build
+
+
+def build_card(numbers, strings):
+    card = StudentCard(numbers[0], "Student Card", strings[0], strings[1], strings[2])
+    card.set_raw_borrowed_books(strings[3])
+    return card
+
+BOOK_LAYOUT = BinaryLayout(
+    1, 'iii', 2,
+    lambda book: (book.id, book.year, book.quantity),
+    lambda book: (book.title, book.author),
+    Book.from_string,
+    lambda numbers, strings: Book(numbers[0], strings[0], strings[1], numbers[1], numbers[2]))
+
+CARD_LAYOUT = BinaryLayout(
+    2, 'i', 4,
+    lambda card: (card.id,),
+    lambda card: (card.student_name, card.issue_date, card.group, card.borrowed_books_json()),
+    StudentCard.from_string,
+    build_card)
+
+LAYOUTS = {layout.kind: layout for layout in (BOOK_LAYOUT, CARD_LAYOUT)}
+
+
+def write_binary_catalog(filename, records, layout):
+    strings = bytearray()
+    string_offsets = {}
+    index = []
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as file:
+        file.write(bytes(HEADER.size))
+        for position, record in enumerate(records):
+            fields = []
+            for text in layout.strings(record):
+                # Repeated strings such as authors and groups are stored once
+                if text not in string_offsets:
+                    string_offsets[text] = len(strings)
+                    strings += text.encode('utf-8')
+                fields += (string_offsets[text], len(text.encode('utf-8')))
+            file.write(layout.record.pack(*layout.numbers(record), *fields))
+            index.append((record.id, position))
+        index_offset = file.tell()
+        index.sort()
+        for entry in index:
+            file.write(INDEX_ENTRY.pack(*entry))
+        strings_offset = file.tell()
+        file.write(strings)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, layout.kind, len(index), HEADER.size, index_offset, strings_offset))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_filename, filename)
+
+
+class BinaryCatalog:
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, kind, self.count, self.records_offset, self.index_offset, self.strings_offset = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or kind not in LAYOUTS:
+            self.close()
+            raise ValueError(f"Not a binary catalog: {filename}")
+        self.layout = LAYOUTS[kind]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(self.count))]
+        if position < 0:
+            position += self.count
+        if not 0 <= position < self.count:
+            raise IndexError("Catalog position out of range")
+        values = self.layout.record.unpack_from(self.mm, self.records_offset + position * self.layout.record.size)
+        numbers = values[:self.layout.number_count]
+        strings = []
+        for i in range(self.layout.number_count, len(values), 2):
+            start = self.strings_offset + values[i]
+            strings.append(self.mm[start:start + values[i + 1]].decode('utf-8'))
+        return self.layout.build(numbers, strings)
+
+    def __iter__(self):
+        for position in range(self.count):
+            yield self[position]
+
+    def position_of(self, record_id):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_id, position = INDEX_ENTRY.unpack_from(self.mm, self.index_offset + middle * INDEX_ENTRY.size)
+            if entry_id == record_id:
+                return position
+            if entry_id < record_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def get(self, record_id, default=None):
+        position = self.position_of(record_id)
+        return default if position is None else self[position]
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def convert_text_to_binary(text_filename, binary_filename, layout):
+    records = (record for chunk in iter_records_from_file(text_filename, layout.parse) for record in chunk)
+    write_binary_catalog(binary_filename, records, layout)
+
+def convert_binary_to_text(binary_filename, text_filename):
+    with BinaryCatalog(binary_filename) as catalog:
+        atomic_write_lines(text_filename, (record.to_string() for record in catalog))
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between the text catalog files and the binary catalog format")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    to_binary = subparsers.add_parser("to-binary")
+    to_binary.add_argument("kind", choices=["books", "cards"])
+    to_binary.add_argument("text_file")
+    to_binary.add_argument("binary_file")
+    to_text = subparsers.add_parser("to-text")
+    to_text.add_argument("binary_file")
+    to_text.add_argument("text_file")
+    args = parser.parse_args()
+
+    if args.command == "to-binary":
+        convert_text_to_binary(args.text_file, args.binary_file, BOOK_LAYOUT if args.kind == "books" else CARD_LAYOUT)
+    else:
+        convert_binary_to_text(args.binary_file, args.text_file)
+
+if __name__ == "__main__":
+    main()
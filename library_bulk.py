@@ -0,0 +1,224 @@
+import argparse
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from library_module import Book, StudentCard, parse_date, parse_loans
+from library_file_handler import TextFileBackend, atomic_write_lines
+from library_sqlite import SqliteBackend
+
+RANGES_PER_WORKER = 4
+MIN_RANGE_SIZE = 256 * 1024
+DUPLICATE_POLICIES = ("skip", "replace", "renumber")
+EXPORT_FORMATS = {".txt": "text", ".csv": "csv", ".jsonl": "jsonl"}
+BOOK_FIELDS = ["id", "title", "author", "year", "quantity"]
+CARD_FIELDS = ["id", "student_name", "issue_date", "group", "borrowed_books"]
+
+
+def validate_book(book):
+    if not book.title or not book.author:
+        raise ValueError("Title and author must be filled out")
+    if book.quantity < 0:
+        raise ValueError("Quantity must not be negative")
+
+def validate_card(card):
+    if not card.student_name or not card.group:
+        raise ValueError("Name and group must be filled out")
+    parse_date(card.issue_date)
+    try:
+        parse_loans(json.loads(card.raw_borrowed_books))
+    except (AttributeError, TypeError):
+        raise ValueError("Borrowed books must be a list of {book id: due date} objects")
+
+def record_row(kind, record):
+    if kind == "books":
+        return (record.id, record.title, record.author, record.year, record.quantity)
+    return (record.id, record.student_name, record.issue_date, record.group, record.borrowed_books_json())
+
+def book_from_row(row):
+    return Book(*row)
+
+def card_from_row(row):
+    card = StudentCard(row[0], "Student Card", row[1], row[2], row[3])
+    card.set_raw_borrowed_books(row[4])
+    return card
+
+KINDS = {"books": (Book.from_string, validate_book, book_from_row), "cards": (StudentCard.from_string, validate_card, card_from_row)}
+
+
+def split_byte_ranges(filename, count):
+    size = os.path.getsize(filename)
+    count = max(1, min(count, size // MIN_RANGE_SIZE))
+    boundaries = [0]
+    with open(filename, 'rb') as file:
+        for part in range(1, count):
+            file.seek(max(size * part // count, boundaries[-1]))
+            file.readline()  # Ranges end on line boundaries, so no line is split between workers
+            boundaries.append(min(file.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+def parse_range(filename, kind, start, end):
+    # Runs in a worker process; returns valid records as plain tuples, which pickle several times
+    # faster than slotted objects, and (byte offset, reason, line) for the rest
+    parse, validate, _ = KINDS[kind]
+    rows = []
+    rejects = []
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    offset = start
+    for raw_line in data.split(b'\n'):
+        line_offset = offset
+        offset += len(raw_line) + 1
+        if not raw_line.strip():
+            continue
+        try:
+            record = parse(raw_line.decode('utf-8'))
+            validate(record)
+        except ValueError as e:
+            rejects.append((line_offset, str(e).splitlines()[0], raw_line.decode('utf-8', 'replace').rstrip('\r')))
+            continue
+        rows.append(record_row(kind, record))
+    return rows, rejects
+
+def parse_file(filename, kind, workers=None):
+    workers = workers or os.cpu_count()
+    build = KINDS[kind][2]
+    ranges = split_byte_ranges(filename, workers * RANGES_PER_WORKER)
+    starts = [start for start, _ in ranges]
+    ends = [end for _, end in ranges]
+    if workers == 1 or len(ranges) == 1:
+        results = map(parse_range, repeat(filename), repeat(kind), starts, ends)
+        for rows, rejects in results:
+            yield [build(row) for row in rows], rejects
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows, rejects in executor.map(parse_range, repeat(filename), repeat(kind), starts, ends):
+            yield [build(row) for row in rows], rejects
+
+
+class ImportResult:
+    def __init__(self):
+        self.added = 0
+        self.replaced = 0
+        self.renumbered = 0
+        self.rejected = 0
+
+    def summary(self):
+        return f"{self.added} added, {self.replaced} replaced, {self.renumbered} renumbered, {self.rejected} rejected"
+
+
+def import_file(storage, kind, filename, rejects_filename, duplicates="skip", workers=None):
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy: {duplicates}")
+    get = storage.get_book if kind == "books" else storage.get_card
+    result = ImportResult()
+    incoming = {}
+    renumber = []
+    with open(rejects_filename, 'w', encoding='utf-8') as rejects_file:
+        def reject(offset, reason, line):
+            result.rejected += 1
+            rejects_file.write(f"{offset} | {reason} | {line}\n")
+
+        for records, rejects in parse_file(filename, kind, workers):
+            for offset, reason, line in rejects:
+                reject(offset, reason, line)
+            for record in records:
+                if record.id not in incoming and get(record.id) is None:
+                    incoming[record.id] = record
+                elif duplicates == "replace":
+                    incoming[record.id] = record  # The last occurrence in the file wins
+                elif duplicates == "renumber":
+                    renumber.append(record)
+                else:
+                    reject("-", f"Duplicate ID: {record.id}", record.to_string())
+
+        # Fresh IDs are handed out once the whole file is read, so they cannot collide with IDs later in the input
+        next_id = max([storage.next_book_id() if kind == "books" else storage.next_card_id()] + [record_id + 1 for record_id in incoming])
+        for record in renumber:
+            record.id = next_id
+            next_id += 1
+            incoming[record.id] = record
+        result.renumbered = len(renumber)
+
+        records = list(incoming.values())
+        replaced_ids = {record.id for record in records if get(record.id) is not None}
+        # The backend leaves out records that would put more copies on loan than are in stock
+        rejected = storage.import_books(records) if kind == "books" else storage.import_cards(records)
+        for record, reason in rejected:
+            reject("-", reason, record.to_string())
+            replaced_ids.discard(record.id)
+        result.replaced = len(replaced_ids)
+        result.added = len(records) - len(rejected) - result.replaced
+    return result
+
+
+def export_lines(records, kind, format):
+    fields = BOOK_FIELDS if kind == "books" else CARD_FIELDS
+    if format == "text":
+        for record in records:
+            yield record.to_string()
+    elif format == "jsonl":
+        for record in records:
+            item = dict(zip(fields, record_row(kind, record)))
+            if kind == "cards":
+                item["borrowed_books"] = record.borrowed_books
+            yield json.dumps(item, ensure_ascii=False)
+    elif format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='')
+        writer.writerow(fields)
+        yield buffer.getvalue()
+        for record in records:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(record_row(kind, record))
+            yield buffer.getvalue()
+    else:
+        raise ValueError(f"Unknown export format: {format}")
+
+def export_file(storage, kind, filename, format=None):
+    format = format or EXPORT_FORMATS.get(os.path.splitext(filename)[1], "text")
+    records = storage.all_books() if kind == "books" else storage.all_cards()
+    atomic_write_lines(filename, export_lines(records, kind, format))
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import and export of the library catalog")
+    parser.add_argument("--sqlite", metavar="DATABASE", help="use an SQLite catalog instead of books.txt and students.txt")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="parse a books or student cards text file in parallel and merge it into the catalog")
+    import_parser.add_argument("kind", choices=KINDS)
+    import_parser.add_argument("input_file")
+    import_parser.add_argument("--rejects", help="where to write rejected lines (default: INPUT_FILE.rejects)")
+    import_parser.add_argument("--duplicates", choices=DUPLICATE_POLICIES, default="skip",
+                               help="what to do with IDs already in the catalog or repeated in the file; renumbering books breaks loans that refer to them")
+    import_parser.add_argument("--workers", type=int, help="parser processes (default: one per core)")
+
+    export_parser = commands.add_parser("export", help="stream the books or student cards out as text, CSV or JSON Lines")
+    export_parser.add_argument("kind", choices=KINDS)
+    export_parser.add_argument("output_file")
+    export_parser.add_argument("--format", choices=sorted(set(EXPORT_FORMATS.values())), help="default: from the file extension")
+    args = parser.parse_args()
+
+    storage = SqliteBackend(args.sqlite) if args.sqlite else TextFileBackend().load_all()
+    try:
+        if args.command == "import":
+            rejects_filename = args.rejects or args.input_file + '.rejects'
+            result = import_file(storage, args.kind, args.input_file, rejects_filename, args.duplicates, args.workers)
+            print(f"Imported {args.input_file}: {result.summary()}")
+            if result.rejected:
+                print(f"Rejected lines written to {rejects_filename}")
+        else:
+            count = export_file(storage, args.kind, args.output_file, args.format)
+            print(f"Exported {count} {args.kind} to {args.output_file}")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
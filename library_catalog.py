@@ -0,0 +1,141 @@
+from array import array
+from itertools import compress
+from operator import attrgetter
+from background_search import SearchCancelled
+
+BOOK_SORT_KEYS = {"id": "id", "title": "title", "author": "author", "year": "year", "quantity": "quantity"}
+CARD_SORT_KEYS = {"id": "id", "name": "student_name", "issue date": "issue_date", "group": "group"}
+CHECK_EVERY = 4096
+COMPACT_MIN_DEAD = 1024
+
+
+class Repository:
+    # Every record keeps the slot it was added in; a delete only marks the slot dead, so the
+    # positions held by a RecordView keep pointing at the same record. Once dead slots outnumber
+    # live ones the records move to a fresh sequence, and views made before keep the old one
+    def __init__(self, items=None, store=None):
+        # store is the empty sequence records are kept in: a list, or a column store from library_columns
+        self.items = store if store is not None else []
+        self.live = bytearray()
+        self.positions = {}
+        self.last_id = 0
+        self.all_view = None
+        for item in items or []:
+            self.add(item)
+
+    def __iter__(self):
+        if len(self.positions) == len(self.items):
+            return iter(self.items)
+        return compress(self.items, self.live)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, position):
+        return self.view()[position]
+
+    def __contains__(self, item_id):
+        return item_id in self.positions
+
+    def get(self, item_id, default=None):
+        position = self.positions.get(item_id)
+        return default if position is None else self.items[position]
+
+    def next_id(self):
+        return self.last_id + 1
+
+    def add(self, item):
+        if item.id in self.positions:
+            raise ValueError(f"Duplicate ID: {item.id}")
+        self.positions[item.id] = len(self.items)
+        self.items.append(item)
+        self.live.append(1)
+        self.last_id = max(self.last_id, item.id)
+        self.all_view = None
+
+    def remove(self, item_id):
+        position = self.positions.pop(item_id)
+        self.live[position] = 0
+        self.all_view = None
+        item = self.items[position]
+        dead = len(self.items) - len(self.positions)
+        if dead > max(len(self.positions), COMPACT_MIN_DEAD):
+            self.compact()
+        return item
+
+    def compact(self):
+        items = type(self.items)()
+        for item in self:
+            items.append(item)
+        self.items = items
+        self.live = bytearray(b'\x01') * len(items)
+        self.positions = {item.id: position for position, item in enumerate(items)}
+
+    def replace_many(self, items):
+        # Swaps in new objects for existing IDs, keeping their slots
+        for item in items:
+            self.items[self.positions[item.id]] = item
+
+    def view(self):
+        # Views are never modified in place, so the one over every live record is shared until the next add or remove
+        if self.all_view is None:
+            if len(self.positions) == len(self.items):
+                positions = array('I', range(len(self.items)))
+            else:
+                positions = array('I', compress(range(len(self.items)), self.live))
+            self.all_view = RecordView(self.items, positions)
+        return self.all_view
+
+    def view_of_ids(self, item_ids):
+        positions = self.positions
+        return RecordView(self.items, array('I', (positions[item_id] for item_id in item_ids if item_id in positions)))
+
+
+class RecordView:
+    # An ordered selection of a repository's records held as an array of slot positions; filtering
+    # and sorting make new views without copying any record
+    def __init__(self, items, positions):
+        # The repository's sequence when the view was made, which a compaction does not touch
+        self.items = items
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, position):
+        items = self.items
+        if isinstance(position, slice):
+            return [items[slot] for slot in self.positions[position]]
+        return items[self.positions[position]]
+
+    def __iter__(self):
+        return map(self.items.__getitem__, self.positions)
+
+    def where(self, predicate, cancelled=None):
+        # Visits only the records in this view, so chained filters get cheaper as the result narrows
+        items = self.items
+        positions = array('I')
+        for start in range(0, len(self.positions), CHECK_EVERY):
+            if cancelled is not None and cancelled.is_set():
+                raise SearchCancelled()
+            chunk = self.positions[start:start + CHECK_EVERY]
+            positions.extend(compress(chunk, map(predicate, map(items.__getitem__, chunk))))
+        return RecordView(self.items, positions)
+
+    def sorted(self, attribute, descending=False):
+        items = self.items
+        value = attrgetter(attribute)
+        if isinstance(value(items[self.positions[0]]) if self.positions else None, str):
+            key = lambda slot: value(items[slot]).lower()
+        else:
+            key = lambda slot: value(items[slot])
+        return RecordView(self.items, array('I', sorted(self.positions, key=key, reverse=descending)))
+
+
+class Catalog:
+    def __init__(self, books=None, cards=None):
+        self.books = Repository(books)
+        self.cards = Repository(cards)
+
+    def borrowed_books_info(self, card):
+        return card.get_borrowed_books_info(self.books)
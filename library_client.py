@@ -0,0 +1,210 @@
+import http.client
+import json
+import threading
+from urllib.parse import urlsplit, urlencode
+from library_module import Book, StudentCard, parse_date
+from library_service import ValidationError
+from library_file_handler import ConflictError
+
+PAGE_SIZE = 100
+
+
+class RemoteResult:
+    # Search results held on the server; pages are requested as the list scrolls to them
+    def __init__(self, client, path, query, parse):
+        self.client = client
+        self.path = path
+        self.query = query
+        self.parse = parse
+        self.pages = {}
+        self.total = self.load_page(0)
+
+    def load_page(self, page):
+        response = self.client.request("GET", self.path, dict(self.query, offset=page * PAGE_SIZE, limit=PAGE_SIZE))
+        self.pages[page] = [self.parse(item) for item in response["items"]]
+        return response["total"]
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(self.total))]
+        if position < 0:
+            position += self.total
+        if not 0 <= position < self.total:
+            raise IndexError("Result position out of range")
+        page = position // PAGE_SIZE
+        if page not in self.pages:
+            self.load_page(page)
+        return self.pages[page][position % PAGE_SIZE]
+
+    def __iter__(self):
+        for position in range(self.total):
+            yield self[position]
+
+
+class LibraryClient:
+    loading = False
+
+    def __init__(self, base_url="http://127.0.0.1:8080"):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.local = threading.local()
+        self.borrowed_info = {}
+
+    def connection(self):
+        # http.client connections are not thread safe, so the Tk thread and the search worker each keep their own
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return self.local.connection
+
+    def request(self, method, path, query=None, body=None):
+        if query:
+            path = f"{path}?{urlencode(query)}"
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        try:
+            self.connection().request(method, path, body=data, headers=headers)
+            response = self.connection().getresponse()
+            payload = json.loads(response.read().decode('utf-8'))
+        except (http.client.HTTPException, ConnectionError):
+            self.local.connection = None
+            raise
+        if response.status == 400:
+            raise ValidationError(payload["error"])
+        if response.status == 404:
+            raise KeyError(path)
+        if response.status == 409:
+            raise ConflictError(payload["error"])
+        if response.status >= 300:
+            raise RuntimeError(f"Server error {response.status}: {payload.get('error')}")
+        return payload
+
+    def parse_book(self, item):
+        return Book(item["id"], item["title"], item["author"], item["year"], item["quantity"])
+
+    def parse_card(self, item):
+        card = StudentCard(item["id"], "Student Card", item["student_name"], item["issue_date"], item["group"], item["borrowed_books"])
+        self.borrowed_info[card.id] = [(book_name, parse_date(due_date)) for book_name, due_date in item["borrowed_books_info"]]
+        return card
+
+    def load_next_chunk(self):
+        return False
+
+    def count_books(self):
+        return self.request("GET", "/status")["books"]
+
+    def count_cards(self):
+        return self.request("GET", "/status")["cards"]
+
+    def changes_since(self, version):
+        # Other clients may have written anything, and every page is fetched fresh anyway
+        return None, None
+
+    def get_book(self, book_id):
+        try:
+            return self.parse_book(self.request("GET", f"/books/{book_id}"))
+        except KeyError:
+            return None
+
+    def get_card(self, card_id):
+        try:
+            return self.parse_card(self.request("GET", f"/cards/{card_id}"))
+        except KeyError:
+            return None
+
+    def book_version(self, book_id):
+        try:
+            return self.request("GET", f"/books/{book_id}")["version"]
+        except KeyError:
+            return None
+
+    def card_version(self, card_id):
+        try:
+            return self.request("GET", f"/cards/{card_id}")["version"]
+        except KeyError:
+            return None
+
+    def checkout(self, card_id, book_ids, due_date):
+        return self.lend_and_return(checkouts=[(card_id, book_id, due_date) for book_id in book_ids])
+
+    def return_books(self, card_id, book_ids):
+        return self.lend_and_return(returns=[(card_id, book_id) for book_id in book_ids])
+
+    def lend_and_return(self, checkouts=(), returns=()):
+        body = {"checkout": [{"card_id": card_id, "book_id": book_id, "due_date": due_date} for card_id, book_id, due_date in checkouts],
+                "return": [{"card_id": card_id, "book_id": book_id} for card_id, book_id in returns]}
+        return [self.parse_card(item) for item in self.request("POST", "/loans", body=body)["cards"]]
+
+    def outstanding_loans(self, book_id):
+        return self.request("GET", f"/books/{book_id}/availability")["outstanding"]
+
+    def available_copies(self, book_id):
+        return self.request("GET", f"/books/{book_id}/availability")["available"]
+
+    def top_borrowed(self, count=10):
+        return [(self.parse_book(item["book"]) if item["book"] is not None else None, item["outstanding"])
+                for item in self.request("GET", "/stats/top-borrowed", {"count": count})]
+
+    def group_stats(self):
+        return [(item["group"], item["cards"], item["loans"]) for item in self.request("GET", "/stats/groups")]
+
+    def sync(self):
+        # The server follows other writers itself, and pages are fetched fresh
+        return False
+
+    def book_ids_by_title(self):
+        return self.request("GET", "/books/titles")
+
+    def borrowed_books_info(self, card):
+        return self.borrowed_info.get(card.id, [])
+
+    def search_books(self, field, term, cancelled=None, year_range=None, in_stock=False, sort_by=None, descending=False, fuzzy=False):
+        query = {"field": field, "term": term}
+        first_year, last_year = year_range or (None, None)
+        if first_year is not None:
+            query["year_from"] = first_year
+        if last_year is not None:
+            query["year_to"] = last_year
+        if in_stock:
+            query["in_stock"] = 1
+        if fuzzy:
+            query["fuzzy"] = 1
+        return RemoteResult(self, "/books", dict(query, **self.sort_query(sort_by, descending)), self.parse_book)
+
+    def search_cards(self, field, term, cancelled=None, sort_by=None, descending=False, fuzzy=False):
+        query = {"field": field, "term": term, "fuzzy": 1} if fuzzy else {"field": field, "term": term}
+        return RemoteResult(self, "/cards", dict(query, **self.sort_query(sort_by, descending)), self.parse_card)
+
+    def sort_query(self, sort_by, descending):
+        if not sort_by:
+            return {}
+        return {"sort": sort_by, "descending": 1} if descending else {"sort": sort_by}
+
+    def add_book(self, title, author, year, quantity):
+        return self.parse_book(self.request("POST", "/books", body={"title": title, "author": author, "year": year, "quantity": quantity}))
+
+    def update_book(self, book_id, title, author, year, quantity, expected_version=None):
+        return self.parse_book(self.request("PUT", f"/books/{book_id}", body={"title": title, "author": author, "year": year, "quantity": quantity,
+                                                                           "expected_version": expected_version}))
+
+    def delete_book(self, book_id, expected_version=None):
+        self.request("DELETE", f"/books/{book_id}", self.version_query(expected_version))
+
+    def add_card(self, name, issue_date, group, borrowed_books):
+        return self.parse_card(self.request("POST", "/cards", body={"student_name": name, "issue_date": issue_date, "group": group, "borrowed_books": borrowed_books}))
+
+    def update_card(self, card_id, name, issue_date, group, borrowed_books, expected_version=None):
+        return self.parse_card(self.request("PUT", f"/cards/{card_id}", body={"student_name": name, "issue_date": issue_date, "group": group, "borrowed_books": borrowed_books,
+                                                                           "expected_version": expected_version}))
+
+    def delete_card(self, card_id, expected_version=None):
+        self.request("DELETE", f"/cards/{card_id}", self.version_query(expected_version))
+
+    def version_query(self, expected_version):
+        return None if expected_version is None else {"expected_version": expected_version}
+
+    def close(self):
+        pass
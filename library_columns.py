@@ -0,0 +1,144 @@
+import sys
+from array import array
+from datetime import date
+from library_module import Book, StudentCard, Loan, parse_date
+
+COMPACT_MIN_ROWS = 4096
+
+# Sequences of records stored column by column, usable as a Repository's items: a Book or StudentCard
+# is built on each access, so they trade search speed for memory
+
+class BookColumns:
+    def __init__(self, books=()):
+        self.ids = array('i')
+        self.years = array('i')
+        self.quantities = array('i')
+        self.titles = []
+        self.authors = []
+        for book in books:
+            self.append(book)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        return Book(self.ids[position], self.titles[position], self.authors[position], self.years[position], self.quantities[position])
+
+    def __setitem__(self, position, book):
+        self.ids[position] = book.id
+        self.years[position] = book.year
+        self.quantities[position] = book.quantity
+        self.titles[position] = book.title
+        # Authors repeat across many books, so every copy shares one string object
+        self.authors[position] = sys.intern(book.author)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def append(self, book):
+        self.ids.append(0)
+        self.years.append(0)
+        self.quantities.append(0)
+        self.titles.append(None)
+        self.authors.append(None)
+        self[len(self.ids) - 1] = book
+
+
+class LoanTable:
+    def __init__(self):
+        self.card_ids = array('i')
+        self.book_ids = array('i')
+        self.due_ordinals = array('i')
+
+    def __len__(self):
+        return len(self.card_ids)
+
+    def append(self, card_id, book_id, due_date):
+        self.card_ids.append(card_id)
+        self.book_ids.append(book_id)
+        self.due_ordinals.append(due_date.toordinal())
+        return len(self.card_ids) - 1
+
+    def rows(self, start, count):
+        return [Loan(self.book_ids[row], date.fromordinal(self.due_ordinals[row])) for row in range(start, start + count)]
+
+    def extend_from(self, other, start, count):
+        self.card_ids.extend(other.card_ids[start:start + count])
+        self.book_ids.extend(other.book_ids[start:start + count])
+        self.due_ordinals.extend(other.due_ordinals[start:start + count])
+
+
+class CardColumns:
+    def __init__(self, cards=()):
+        self.ids = array('i')
+        # Issue dates are free text in the form, so unparseable ones keep their string in issue_date_text
+        self.issue_ordinals = array('i')
+        self.issue_date_text = {}
+        self.names = []
+        self.groups = []
+        self.loan_starts = array('I')
+        self.loan_counts = array('I')
+        self.loans = LoanTable()
+        self.referenced_loans = 0
+        for card in cards:
+            self.append(card)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        ordinal = self.issue_ordinals[position]
+        issue_date = date.fromordinal(ordinal).isoformat() if ordinal else self.issue_date_text[position]
+        card = StudentCard(self.ids[position], "Student Card", self.names[position], issue_date, self.groups[position])
+        card.set_loans(self.loans.rows(self.loan_starts[position], self.loan_counts[position]))
+        return card
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def append(self, card):
+        self.ids.append(0)
+        self.issue_ordinals.append(0)
+        self.loan_starts.append(0)
+        self.loan_counts.append(0)
+        self.names.append(None)
+        self.groups.append(None)
+        self[len(self.ids) - 1] = card
+
+    def __setitem__(self, position, card):
+        self.ids[position] = card.id
+        try:
+            issue_date = parse_date(card.issue_date)
+        except ValueError:
+            issue_date = None
+        if issue_date is not None and issue_date.isoformat() == card.issue_date:
+            self.issue_ordinals[position] = issue_date.toordinal()
+            self.issue_date_text.pop(position, None)
+        else:
+            self.issue_ordinals[position] = 0
+            self.issue_date_text[position] = card.issue_date
+        self.names[position] = card.student_name
+        self.groups[position] = sys.intern(card.group)
+        # Edited loans are appended as new rows; the old rows are no longer referenced, and are
+        # dropped once they outnumber the rest
+        self.referenced_loans += len(card.loans) - self.loan_counts[position]
+        self.loan_starts[position] = len(self.loans)
+        self.loan_counts[position] = len(card.loans)
+        for loan in card.loans:
+            self.loans.append(card.id, loan.book_id, loan.due_date)
+        if len(self.loans) - self.referenced_loans > max(self.referenced_loans, COMPACT_MIN_ROWS):
+            self.compact_loans()
+
+    def compact_loans(self):
+        loans = LoanTable()
+        for position in range(len(self.ids)):
+            start = len(loans)
+            loans.extend_from(self.loans, self.loan_starts[position], self.loan_counts[position])
+            self.loan_starts[position] = start
+        self.loans = loans
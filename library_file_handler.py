@@ -1,31 +1,847 @@
+import os
+import threading
+from contextlib import contextmanager
 from library_module import Book, StudentCard
+from library_catalog import Catalog, Repository, BOOK_SORT_KEYS, CARD_SORT_KEYS
+from library_columns import BookColumns, CardColumns
+from library_search import book_search_index, card_search_index
+from due_date_index import DueDateIndex
+from loan_ledger import LoanLedger, UnavailableError, split_by_outstanding
+from instrumentation import instrumented, count
 
-def read_books_from_file(filename):
-    books = []
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: writes are still serialized within one process, but not across processes
+
+CHUNK_SIZE = 1000
+
+def iter_records_from_file(filename, parse, chunk_size=CHUNK_SIZE):
+    chunk = []
     with open(filename, 'r', encoding='utf-8') as file:
         for line in file:
             try:
-                books.append(Book.from_string(line))
+                chunk.append(parse(line))
             except ValueError as e:
                 print(e)
-    return books
+                count("parse.rejected")
+                continue
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
 
+def iter_books_from_file(filename, chunk_size=CHUNK_SIZE):
+    return iter_records_from_file(filename, Book.from_string, chunk_size)
+
+@instrumented("file.read_books")
+def read_books_from_file(filename):
+    return [book for chunk in iter_books_from_file(filename) for book in chunk]
+
+@instrumented("file.write_books")
 def write_books_to_file(filename, books):
-    with open(filename, 'w', encoding='utf-8') as file:
-        for book in books:
-            file.write(book.to_string() + '\n')
+    atomic_write_lines(filename, (book.to_string() for book in books))
 
+def iter_student_cards_from_file(filename, chunk_size=CHUNK_SIZE):
+    return iter_records_from_file(filename, StudentCard.from_string, chunk_size)
+
+@instrumented("file.read_cards")
 def read_student_cards_from_file(filename):
-    cards = []
-    with open(filename, 'r', encoding='utf-8') as file:
-        for line in file:
+    return [card for chunk in iter_student_cards_from_file(filename) for card in chunk]
+
+@instrumented("file.write_cards")
+def write_student_cards_to_file(filename, cards):
+    atomic_write_lines(filename, (card.to_string() for card in cards))
+
+@instrumented("file.atomic_write")
+def atomic_write_lines(filename, lines):
+    # Write next to the target and rename over it, so a crash leaves either the old or the new file
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w', encoding='utf-8') as file:
+        for line in lines:
+            file.write(line + '\n')
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_filename, filename)
+
+
+class ConflictError(Exception):
+    pass
+
+
+class FileLock:
+    # An advisory fcntl lock on a side file, shared by every process that opens the same catalog.
+    # Holds are counted, so a compaction thread can keep the file locked for other processes after
+    # the writer that started it has let this process's other threads back in
+    def __init__(self, filename):
+        self.filename = filename
+        self.thread_lock = threading.RLock()
+        self.state_lock = threading.Lock()
+        self.holds = 0
+        self.file = None
+
+    def hold(self):
+        with self.state_lock:
+            if not self.holds:
+                self.file = open(self.filename, 'a')
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            self.holds += 1
+
+    def unhold(self):
+        with self.state_lock:
+            self.holds -= 1
+            if not self.holds:
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+                self.file.close()
+                self.file = None
+
+    def acquire(self):
+        self.thread_lock.acquire()
+        self.hold()
+
+    def release(self):
+        self.unhold()
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def file_identity(filename):
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class JournaledFile:
+    COMPACT_THRESHOLD = 1024 * 1024
+
+    def __init__(self, filename, parse, compact_threshold=COMPACT_THRESHOLD):
+        self.filename = filename
+        self.parse = parse
+        self.log_filename = filename + '.log'
+        self.compacting_filename = filename + '.log.compacting'
+        self.versions_filename = filename + '.versions'
+        self.compact_threshold = compact_threshold
+        self.lock = FileLock(filename + '.lock')
+        self.compaction = None
+        self.loaded = False
+        # What has been read so far: the log is identified by inode, since a compaction in any process replaces it.
+        # It stays open, so what was appended to it just before another process compacted can still be read
+        self.log_file = None
+        self.log_inode = None
+        self.log_offset = 0
+        self.base_identity = None
+        # Every log entry carries a sequence number, and a record's version is the number of its last write.
+        # Versions outlive compaction in the versions file; records never written since it existed share base_lsn
+        self.lsn = 0
+        self.base_lsn = 0
+        self.versions = {}
+
+    def load(self):
+        return [record for chunk in self.load_chunks() for record in chunk]
+
+    def load_chunks(self, chunk_size=CHUNK_SIZE):
+        with self.lock:
+            # A compacting log left behind when we hold the lock means a process crashed mid-compaction; fold it
+            # back into the live log, and drop any torn tail so new entries are not appended onto half a line
+            entries = self.read_log(self.log_filename)
+            if os.path.exists(self.compacting_filename):
+                # The live log's header names a snapshot that may never have been written
+                entries = self.read_log(self.compacting_filename) + [entry for entry in entries if not entry.startswith('base ')]
+            log_size = os.path.getsize(self.log_filename) if os.path.exists(self.log_filename) else 0
+            if os.path.exists(self.compacting_filename) or log_size != sum(len(entry.encode('utf-8')) + 1 for entry in entries):
+                atomic_write_lines(self.log_filename, entries)
+                if os.path.exists(self.compacting_filename):
+                    os.remove(self.compacting_filename)
+            if not os.path.exists(self.log_filename):
+                open(self.log_filename, 'a').close()
+            self.follow_log(open(self.log_filename, 'rb'))
+            self.log_offset = os.fstat(self.log_file.fileno()).st_size
+            self.base_identity = file_identity(self.filename)
+            carried = self.read_versions()
+            self.loaded = False
+
+        # The log is bounded by the compaction threshold, so its net effect is replayed up front
+        # and applied to base records as they stream past
+        self.lsn = 0
+        self.base_lsn = 0
+        self.versions = {}
+        changes = dict(self.replay(entries))
+        if carried is not None:
+            # Entries replayed from the log are newer than anything the last compaction carried over
+            self.base_lsn, versions = carried
+            versions.update(self.versions)
+            self.versions = versions
+
+        if os.path.exists(self.filename):
+            for base_chunk in iter_records_from_file(self.filename, self.parse, chunk_size):
+                chunk = []
+                for record in base_chunk:
+                    if record.id in changes:
+                        record = changes.pop(record.id)
+                        if record is None:
+                            continue
+                    chunk.append(record)
+                yield chunk
+        added = [record for record in changes.values() if record is not None]
+        if added:
+            yield added
+        self.loaded = True
+
+    def read_log(self, log_filename):
+        if not os.path.exists(log_filename):
+            return []
+        entries = []
+        with open(log_filename, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.endswith('\n'):
+                    break  # Torn write from a crash, nothing after it was acknowledged
+                entries.append(line[:-1])
+        return entries
+
+    def read_versions(self):
+        # (base_lsn, {id: version}) as of the last compaction, or None for files compacted before versions were kept
+        if not os.path.exists(self.versions_filename):
+            return None
+        versions = {}
+        with open(self.versions_filename, 'r', encoding='utf-8') as file:
+            base_lsn = int(file.readline())
+            for line in file:
+                record_id, _, version = line.partition(' ')
+                versions[int(record_id)] = int(version)
+        return base_lsn, versions
+
+    def replay(self, entries):
+        # Yields (id, record) for puts and (id, None) for deletes, in log order
+        for entry in entries:
+            op, _, payload = entry.partition(' | ')
+            op, _, lsn = op.partition(' ')
             try:
-                cards.append(StudentCard.from_string(line))
+                lsn = int(lsn) if lsn else self.lsn  # Logs written before versioning have no numbers
+                if op == 'base':
+                    self.base_lsn = lsn
+                    self.lsn = max(self.lsn, lsn)
+                    continue
+                elif op == 'put':
+                    record = self.parse(payload)
+                    record_id = record.id
+                elif op == 'del':
+                    record = None
+                    record_id = int(payload)
+                else:
+                    raise ValueError(f"Invalid log entry: {entry}")
             except ValueError as e:
                 print(e)
-    return cards
+                continue
+            self.lsn = max(self.lsn, lsn)
+            self.versions[record_id] = lsn
+            yield record_id, record
 
-def write_student_cards_to_file(filename, cards):
-    with open(filename, 'w', encoding='utf-8') as file:
+    def version_of(self, record_id):
+        return self.versions.get(record_id, self.base_lsn)
+
+    def changed(self):
+        # Cheap stat check for whether another process appears to have written since the last read
+        log_stat = file_identity(self.log_filename)
+        return log_stat is None or log_stat[:2] != self.log_inode or log_stat[2] != self.log_offset or self.base_changed()
+
+    def poll(self):
+        # The lock is only taken when another process appears to have written
+        if not self.changed():
+            return []
+        with self.lock:
+            return self.poll_locked()
+
+    def poll_locked(self):
+        # Returns the (id, record or None) changes other processes made since the last read,
+        # or None when some of them can no longer be read and everything has to be reloaded
+        changes = self.read_log_tail()
+        log_stat = file_identity(self.log_filename)
+        if log_stat is not None and log_stat[:2] == self.log_inode:
+            return None if self.base_changed() else changes
+        if log_stat is None or os.path.exists(self.compacting_filename):
+            return None  # Left half-done by a crashed process; the next load recovers it
+        # Another process compacted. The old log has been read to its end, so the new one continues
+        # from here if its header names the snapshot as of the last entry read; otherwise a log went by unread
+        file = open(self.log_filename, 'rb')
+        header = file.readline()
+        if header != f"base {self.lsn}\n".encode('utf-8'):
+            file.close()
+            return None
+        self.follow_log(file)
+        self.log_offset = len(header)
+        self.base_identity = file_identity(self.filename)
+        return changes + self.read_log_tail()
+
+    def read_log_tail(self):
+        self.log_file.seek(self.log_offset)
+        data = self.log_file.read()
+        end = data.rfind(b'\n') + 1
+        self.log_offset += end
+        return list(self.replay(data[:end].decode('utf-8').split('\n')[:-1]))
+
+    def follow_log(self, file):
+        if self.log_file is not None:
+            self.log_file.close()
+        self.log_file = file
+        stat = os.fstat(file.fileno())
+        self.log_inode = (stat.st_dev, stat.st_ino)
+
+    def base_changed(self):
+        if self.compaction is not None and self.compaction.is_alive():
+            return False  # Our own snapshot is being written
+        return file_identity(self.filename) != self.base_identity
+
+    @contextmanager
+    def transaction(self):
+        # Held across catching up, the version check and the append, so no other process writes in between
+        with self.lock:
+            yield
+
+    def log_put(self, record):
+        self.append(f"put {self.lsn + 1} | {record.to_string()}", record.id)
+
+    def log_puts(self, records):
+        # One write and one fsync for the lot
+        entries = [f"put {self.lsn + number} | {record.to_string()}" for number, record in enumerate(records, 1)]
+        self.append_many(entries, [record.id for record in records])
+
+    def log_delete(self, record_id):
+        self.append(f"del {self.lsn + 1} | {record_id}", record_id)
+
+    def append(self, entry, record_id):
+        self.append_many([entry], [record_id])
+
+    @instrumented("journal.append")
+    def append_many(self, entries, record_ids):
+        # Callers hold the lock and have caught up, so lsn + 1 is the next number across all processes
+        data = ''.join(entry + '\n' for entry in entries).encode('utf-8')
+        with open(self.log_filename, 'ab') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        self.log_offset += len(data)
+        for record_id in record_ids:
+            self.lsn += 1
+            self.versions[record_id] = self.lsn
+
+    def compact_if_needed(self, records):
+        if not self.loaded:
+            return  # A snapshot of a partially loaded catalog would drop the unread records
+        if self.compaction is not None and self.compaction.is_alive():
+            return
+        if self.log_offset < self.compact_threshold:
+            return
+        self.compact(records)
+
+    def compact(self, records, wait=False):
+        with self.lock:
+            if self.compaction is not None:
+                self.compaction.join()  # The compacting file still belongs to the previous snapshot
+            # Everything logged so far is reflected in the snapshot; later entries go to a fresh log
+            # whose header records the sequence number the snapshot was taken at
+            os.replace(self.log_filename, self.compacting_filename)
+            header = (f"base {self.lsn}\n").encode('utf-8')
+            with open(self.log_filename, 'wb') as file:
+                file.write(header)
+                file.flush()
+                os.fsync(file.fileno())
+            self.follow_log(open(self.log_filename, 'rb'))
+            self.log_offset = len(header)
+            snapshot = list(records)
+            # Versions are carried into the new base rather than reset, so an edit form opened before the
+            # compaction still saves; deleted records are dropped from them
+            self.versions = {record.id: self.versions[record.id] for record in snapshot if record.id in self.versions}
+            versions = [str(self.base_lsn)] + [f"{record_id} {version}" for record_id, version in self.versions.items()]
+            # Other processes stay locked out until the snapshot is on disk; this process's writers do not
+            self.lock.hold()
+            self.compaction = threading.Thread(target=self.write_snapshot, args=(snapshot, versions), daemon=True)
+            self.compaction.start()
+        if wait:
+            self.compaction.join()
+
+    @instrumented("journal.snapshot")
+    def write_snapshot(self, snapshot, versions):
+        try:
+            # The versions go first: after a crash the compacting log is replayed on top of them, which is harmless
+            atomic_write_lines(self.versions_filename, versions)
+            atomic_write_lines(self.filename, (record.to_string() for record in snapshot))
+            self.base_identity = file_identity(self.filename)
+            os.remove(self.compacting_filename)
+        finally:
+            self.lock.unhold()
+
+    def close(self):
+        if self.compaction is not None:
+            self.compaction.join()
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+class StorageBackend:
+    loading = False
+
+    def load_next_chunk(self):
+        return False
+
+    def all_books(self):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def all_cards(self):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def get_book(self, book_id):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def get_card(self, card_id):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def next_book_id(self):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def next_card_id(self):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def book_ids_by_title(self):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def search_books(self, field, term, cancelled=None, year_range=None, in_stock=False, sort_by=None, descending=False, fuzzy=False):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def search_cards(self, field, term, cancelled=None, sort_by=None, descending=False, fuzzy=False):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def overdue_cards(self, as_of, sort_by=None, descending=False):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def cards_due_within(self, days, today, sort_by=None, descending=False):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def borrowed_books_info(self, card):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def add_book(self, book):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def update_book(self, book, expected_version=None):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def delete_book(self, book_id, expected_version=None):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def add_card(self, card):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def update_card(self, card, expected_version=None):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def delete_card(self, card_id, expected_version=None):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def update_cards(self, cards, expected_versions=None):
+        # Replaces several cards at once, as a checkout or return batch; backends override this to make it atomic
+        for card in cards:
+            self.update_card(card, (expected_versions or {}).get(card.id))
+
+    def outstanding_loans(self, book_id):
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def top_borrowed(self, count):
+        # (book, copies out) pairs, most borrowed first
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def group_stats(self):
+        # (group, cards, loans outstanding) triples, by group
+        raise NotImplementedError("Subclasses should implement this method")
+
+    def book_version(self, book_id):
+        # An opaque stamp that changes whenever the record is written, by this process or another;
+        # None when the backend cannot tell
+        return None
+
+    def card_version(self, card_id):
+        return None
+
+    def changed_elsewhere(self):
+        # A cheap check, made without the service lock, for whether sync() may have anything to pick up
+        return False
+
+    def sync(self):
+        # Picks up writes other processes made to the same storage: a list of ("book" | "card", id)
+        # pairs, or None when everything may have changed
+        return []
+
+    def import_books(self, books):
+        # Bulk insert-or-replace by ID; backends override this with a batched version. Records that would
+        # leave more copies on loan than a book has are left out and returned as (record, reason)
+        books, rejected = split_by_outstanding(books, self.outstanding_loans)
+        for book in books:
+            if self.get_book(book.id) is None:
+                self.add_book(book)
+            else:
+                self.update_book(book)
+        return rejected
+
+    def import_cards(self, cards):
+        rejected = []
         for card in cards:
-            file.write(card.to_string() + '\n')
+            try:
+                if self.get_card(card.id) is None:
+                    self.add_card(card)
+                else:
+                    self.update_card(card)
+            except UnavailableError as e:
+                rejected.append((card, str(e)))
+        return rejected
+
+    def close(self):
+        pass
+
+
+class TextFileBackend(StorageBackend):
+    def __init__(self, books_filename="books.txt", cards_filename="students.txt", columns=False):
+        self.books_journal = JournaledFile(books_filename, Book.from_string)
+        self.cards_journal = JournaledFile(cards_filename, StudentCard.from_string)
+        # The column store keeps records in typed arrays and builds objects on access: less memory, slower scans
+        self.columns = columns
+        self.catalog = Catalog()
+        self.books = self.catalog.books = self.new_repository(BookColumns)
+        self.cards = self.catalog.cards = self.new_repository(CardColumns)
+        self.book_index = book_search_index(self.books)
+        self.card_index = card_search_index(self.cards)
+        self.due_index = DueDateIndex()
+        self.ledger = LoanLedger()
+        self.loaders = [(self.books_journal.load_chunks(), self.add_loaded_books),
+                        (self.cards_journal.load_chunks(), self.add_loaded_cards)]
+        # What other processes changed, as ("book" | "card", id), until the next sync(); None after a reload
+        self.synced_changes = []
+
+    @property
+    def loading(self):
+        return bool(self.loaders)
+
+    @instrumented("storage.load_chunk")
+    def load_next_chunk(self):
+        if not self.loaders:
+            return False
+        chunks, add_chunk = self.loaders.pop(0)
+        chunk = next(chunks, None)
+        if chunk is not None:
+            add_chunk(chunk)
+            self.loaders.append((chunks, add_chunk))
+        if not self.loaders:
+            self.due_index.flush()
+        return bool(self.loaders)
+
+    def load_all(self):
+        while self.load_next_chunk():
+            pass
+        return self
+
+    def add_loaded_books(self, books):
+        for book in books:
+            self.books.add(book)
+            self.book_index.add(book)
+
+    def add_loaded_cards(self, cards):
+        for card in cards:
+            self.cards.add(card)
+            self.card_index.add(card)
+        self.due_index.add_many(cards, defer=True)
+        self.ledger.add_many(cards)
+
+    def all_books(self):
+        return self.books
+
+    def all_cards(self):
+        return self.cards
+
+    def get_book(self, book_id):
+        return self.books.get(book_id)
+
+    def get_card(self, card_id):
+        return self.cards.get(card_id)
+
+    def next_book_id(self):
+        return self.books.next_id()
+
+    def next_card_id(self):
+        return self.cards.next_id()
+
+    def book_ids_by_title(self):
+        return {book.title: book.id for book in self.books}
+
+    @instrumented("storage.search_books")
+    def search_books(self, field, term, cancelled=None, year_range=None, in_stock=False, sort_by=None, descending=False, fuzzy=False):
+        # Each condition narrows a view of positions, so later filters only visit what earlier ones kept
+        if field in ("title", "author"):
+            view = self.books.view_of_ids(self.matching_ids(self.book_index, field, term, fuzzy)) if term else self.books.view()
+        elif field == "year":
+            view = self.books.view().where(lambda book: term == str(book.year), cancelled)
+        else:
+            raise ValueError(f"Unknown book search field: {field}")
+        first_year, last_year = year_range or (None, None)
+        if first_year is not None:
+            view = view.where(lambda book: book.year >= first_year, cancelled)
+        if last_year is not None:
+            view = view.where(lambda book: book.year <= last_year, cancelled)
+        if in_stock:
+            outstanding = self.ledger.outstanding
+            view = view.where(lambda book: book.quantity > outstanding(book.id), cancelled)
+        return view.sorted(BOOK_SORT_KEYS[sort_by], descending) if sort_by else view
+
+    @instrumented("storage.search_cards")
+    def search_cards(self, field, term, cancelled=None, sort_by=None, descending=False, fuzzy=False):
+        if field in ("name", "group"):
+            view = self.cards.view_of_ids(self.matching_ids(self.card_index, field, term, fuzzy)) if term else self.cards.view()
+        elif field == "id":
+            view = self.cards.view_of_ids([int(term)] if term.isdigit() else [])
+        else:
+            raise ValueError(f"Unknown card search field: {field}")
+        return self.sorted_cards(view, sort_by, descending)
+
+    def matching_ids(self, index, field, term, fuzzy):
+        # A fuzzy search keeps its ranking, closest matches first, unless a sort is asked for
+        return index.fuzzy_search(field, term) if fuzzy else sorted(index.search(field, term))
+
+    @instrumented("storage.overdue_cards")
+    def overdue_cards(self, as_of, sort_by=None, descending=False):
+        return self.sorted_cards(self.cards.view_of_ids(self.due_index.overdue(as_of)), sort_by, descending)
+
+    @instrumented("storage.cards_due_within")
+    def cards_due_within(self, days, today, sort_by=None, descending=False):
+        return self.sorted_cards(self.cards.view_of_ids(self.due_index.due_within(days, today)), sort_by, descending)
+
+    def sorted_cards(self, view, sort_by, descending):
+        return view.sorted(CARD_SORT_KEYS[sort_by], descending) if sort_by else view
+
+    def borrowed_books_info(self, card):
+        return self.catalog.borrowed_books_info(card)
+
+    def book_version(self, book_id):
+        return self.books_journal.version_of(book_id)
+
+    def card_version(self, card_id):
+        return self.cards_journal.version_of(card_id)
+
+    def changed_elsewhere(self):
+        return not self.loading and (self.books_journal.changed() or self.cards_journal.changed())
+
+    def sync(self):
+        if self.loading:
+            return []  # Changes made meanwhile are read with the rest of the files
+        self.catch_up_books()
+        self.catch_up_cards()
+        changes, self.synced_changes = self.synced_changes, []
+        return changes
+
+    def catch_up_books(self):
+        # Applies what other processes appended to the books journal since this one last read it.
+        # Only called with the loaded catalog; card writes also catch up on books, so the cards lock
+        # may be held while taking the books lock, never the other way round
+        changes = self.books_journal.poll()
+        if changes is None:
+            self.reload_books()
+            return
+        for book_id, book in changes:
+            if book is None:
+                if book_id in self.books:
+                    self.books.remove(book_id)
+                    self.book_index.remove(book_id)
+            elif book_id in self.books:
+                self.books.replace_many([book])
+                self.book_index.update(book)
+            else:
+                self.books.add(book)
+                self.book_index.add(book)
+            self.note_synced("book", book_id)
+
+    def catch_up_cards(self):
+        changes = self.cards_journal.poll()
+        if changes is None:
+            self.reload_cards()
+            return
+        for card_id, card in changes:
+            if card is None:
+                if card_id in self.cards:
+                    self.cards.remove(card_id)
+                    self.card_index.remove(card_id)
+                    self.due_index.remove(card_id)
+                    self.ledger.remove(card_id)
+            elif card_id in self.cards:
+                self.cards.replace_many([card])
+                self.card_index.update(card)
+                self.due_index.update(card)
+                self.ledger.update(card)
+            else:
+                self.cards.add(card)
+                self.card_index.add(card)
+                self.due_index.add(card)
+                self.ledger.add(card)
+            self.note_synced("card", card_id)
+
+    def note_synced(self, kind, record_id):
+        if self.synced_changes is not None:
+            self.synced_changes.append((kind, record_id))
+
+    def new_repository(self, column_store):
+        return Repository(store=column_store() if self.columns else None)
+
+    def reload_books(self):
+        # Some of what other processes wrote can no longer be read from the journal: a log was compacted away
+        # before this process got to it, or a compaction crashed
+        self.books = self.catalog.books = self.new_repository(BookColumns)
+        self.book_index = book_search_index(self.books)
+        for chunk in self.books_journal.load_chunks():
+            self.add_loaded_books(chunk)
+        self.synced_changes = None
+
+    def reload_cards(self):
+        self.cards = self.catalog.cards = self.new_repository(CardColumns)
+        self.card_index = card_search_index(self.cards)
+        self.due_index = DueDateIndex()
+        self.ledger = LoanLedger()
+        for chunk in self.cards_journal.load_chunks():
+            self.add_loaded_cards(chunk)
+        self.due_index.flush()
+        self.synced_changes = None
+
+    def check_version(self, journal, record_id, expected_version):
+        if expected_version is not None and journal.version_of(record_id) != expected_version:
+            raise ConflictError(f"Record {record_id} was changed by someone else")
+
+    def add_book(self, book):
+        with self.books_journal.transaction():
+            self.catch_up_books()
+            if book.id in self.books:
+                book.id = self.books.next_id()  # Another process took the ID meanwhile
+            # Journaled first, so a failed write leaves nothing in memory that the files do not have
+            self.books_journal.log_put(book)
+            self.books.add(book)
+            self.book_index.add(book)
+            self.books_journal.compact_if_needed(self.books)
+
+    def update_book(self, book, expected_version=None):
+        with self.books_journal.transaction():
+            self.catch_up_books()
+            if book.id not in self.books:
+                raise KeyError(book.id)
+            self.check_version(self.books_journal, book.id, expected_version)
+            self.books_journal.log_put(book)
+            self.books.replace_many([book])
+            self.book_index.update(book)
+            self.books_journal.compact_if_needed(self.books)
+
+    def delete_book(self, book_id, expected_version=None):
+        with self.books_journal.transaction():
+            self.catch_up_books()
+            if book_id not in self.books:
+                raise KeyError(book_id)
+            self.check_version(self.books_journal, book_id, expected_version)
+            self.books_journal.log_delete(book_id)
+            self.books.remove(book_id)
+            self.book_index.remove(book_id)
+            self.books_journal.compact_if_needed(self.books)
+
+    def add_card(self, card):
+        with self.cards_journal.transaction():
+            self.catch_up_cards()
+            self.catch_up_books()
+            if card.id in self.cards:
+                card.id = self.cards.next_id()
+            self.ledger.check([card], self.books)
+            self.cards_journal.log_put(card)
+            self.cards.add(card)
+            self.card_index.add(card)
+            self.due_index.add(card)
+            self.ledger.add(card)
+            self.cards_journal.compact_if_needed(self.cards)
+
+    def update_card(self, card, expected_version=None):
+        self.update_cards([card], {card.id: expected_version})
+
+    def update_cards(self, cards, expected_versions=None):
+        # Every card is checked against the ledger before any is written, and their entries go to the journal in one write
+        with self.cards_journal.transaction():
+            self.catch_up_cards()
+            self.catch_up_books()  # Quantities checked below
+            for card in cards:
+                if card.id not in self.cards:
+                    raise KeyError(card.id)
+                self.check_version(self.cards_journal, card.id, (expected_versions or {}).get(card.id))
+            self.ledger.check(cards, self.books)
+            self.cards_journal.log_puts(cards)
+            self.cards.replace_many(cards)
+            for card in cards:
+                self.card_index.update(card)
+                self.due_index.update(card)
+                self.ledger.update(card)
+            self.cards_journal.compact_if_needed(self.cards)
+
+    def delete_card(self, card_id, expected_version=None):
+        with self.cards_journal.transaction():
+            self.catch_up_cards()
+            if card_id not in self.cards:
+                raise KeyError(card_id)
+            self.check_version(self.cards_journal, card_id, expected_version)
+            self.cards_journal.log_delete(card_id)
+            self.cards.remove(card_id)
+            self.card_index.remove(card_id)
+            self.due_index.remove(card_id)
+            self.ledger.remove(card_id)
+            self.cards_journal.compact_if_needed(self.cards)
+
+    def outstanding_loans(self, book_id):
+        return self.ledger.outstanding(book_id)
+
+    def top_borrowed(self, count):
+        return [(self.books.get(book_id), outstanding) for book_id, outstanding in self.ledger.top_borrowed(count)]
+
+    def group_stats(self):
+        return self.ledger.group_stats()
+
+    def import_books(self, books):
+        with self.books_journal.transaction():
+            self.catch_up_books()
+            books, rejected = split_by_outstanding(books, self.ledger.outstanding)
+            # Logged as one write, so other processes pick the import up from the log rather than reloading
+            self.books_journal.log_puts(books)
+            replaced = [book for book in books if book.id in self.books]
+            self.books.replace_many(replaced)
+            for book in replaced:
+                self.book_index.update(book)
+            self.add_loaded_books([book for book in books if book.id not in self.books])
+            self.books_journal.compact(self.books, wait=True)
+        return rejected
+
+    def import_cards(self, cards):
+        with self.cards_journal.transaction():
+            self.catch_up_cards()
+            self.catch_up_books()
+            cards, rejected = self.ledger.split(cards, self.books)
+            self.cards_journal.log_puts(cards)
+            replaced = [card for card in cards if card.id in self.cards]
+            self.cards.replace_many(replaced)
+            for card in replaced:
+                self.card_index.update(card)
+                self.due_index.update(card)
+                self.ledger.update(card)
+            self.add_loaded_cards([card for card in cards if card.id not in self.cards])
+            self.due_index.flush()
+            self.cards_journal.compact(self.cards, wait=True)
+        return rejected
+
+    def close(self):
+        self.books_journal.close()
+        self.cards_journal.close()
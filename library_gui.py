@@ -1,21 +1,98 @@
+import argparse
 import tkinter as tk
 from tkinter import messagebox, ttk
-from library_module import Book, StudentCard
-from library_file_handler import read_books_from_file, write_books_to_file, read_student_cards_from_file, write_student_cards_to_file
-import json
-from datetime import datetime
+from library_module import Book
+from library_file_handler import TextFileBackend, ConflictError
+from library_sqlite import SqliteBackend
+from library_service import LibraryService, ValidationError
+from library_client import LibraryClient
+from virtual_listbox import VirtualListbox
+from background_search import BackgroundSearch
+from instrumentation import instrumented, start_periodic_dump, ENABLED as INSTRUMENTED
+from metrics_window import MetricsWindow
+from statistics_window import StatisticsWindow
+from render_cache import RenderCache, card_row, card_references
+
+POLL_INTERVAL = 1000
 
 class LibraryGUI:
-    def __init__(self, root):
+    def __init__(self, root, service):
         self.root = root
         self.root.title("Library Management System")
 
-        self.books = read_books_from_file("books.txt")
-        self.student_cards = read_student_cards_from_file("students.txt")
-        self.filtered_books = self.books
-        self.filtered_students = self.student_cards
-
+        # Either an in-process LibraryService or a LibraryClient talking to library_server
+        self.service = service
+        # Only the first chunk of each file is read before the window appears; the rest streams in
+        self.service.load_next_chunk()
+        self.service.load_next_chunk()
+        self.filtered_books = self.service.search_books("title", "")
+        self.filtered_students = self.service.search_cards("name", "")
+        self.searcher = BackgroundSearch(self.root, on_error=self.show_error)
+        self.card_rows = RenderCache(self.format_card, card_references)
+        self.seen_version = None
+        self.sync_failing = False
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.setup_ui()
+        self.root.after(1, self.load_in_background)
+        self.root.after(POLL_INTERVAL, self.poll_changes)
+
+    def load_in_background(self):
+        # Each chunk is read and indexed on the search worker, between searches, and reported back here
+        self.searcher.run(self.service.load_next_chunk, self.chunk_loaded, self.chunk_failed)
+
+    def chunk_loaded(self, more):
+        if more:
+            self.card_rows.clear()  # Titles of books in this chunk may have shown as "Unknown"
+            self.root.title(f"Library Management System (loading: {self.service.count_books()} books, {self.service.count_cards()} students)")
+            if not self.search_entry.get():
+                self.refresh_search()
+            self.root.after(1, self.load_in_background)
+        else:
+            self.root.title("Library Management System")
+            self.card_rows.clear()
+            self.refresh_search()
+
+    def chunk_failed(self, error):
+        # The records that failed stay unread; the other file keeps loading, so writes are not refused for good
+        self.show_error(error)
+        self.root.after(POLL_INTERVAL, self.load_in_background)
+
+    def poll_changes(self):
+        # Other desks may write to the same catalog files; the sync runs on the search worker, since
+        # applying their changes takes the service's write lock
+        if self.service.loading:
+            self.root.after(POLL_INTERVAL, self.poll_changes)
+        else:
+            self.searcher.run(self.service.sync, self.synced, self.sync_failed)
+
+    def synced(self, changed):
+        self.sync_failing = False
+        if changed:
+            self.refresh_search()
+        self.root.after(POLL_INTERVAL, self.poll_changes)
+
+    def sync_failed(self, error):
+        # Reported once rather than every second, and retried until a sync goes through again
+        if not self.sync_failing:
+            self.sync_failing = True
+            self.show_error(error)
+        self.root.after(POLL_INTERVAL, self.poll_changes)
+
+    def show_error(self, error):
+        # What a search or background task raised; a validation error is the user's to fix, anything else is shown as is
+        messagebox.showerror("Error", str(error) if isinstance(error, ValidationError) else f"{type(error).__name__}: {error}")
+
+    def check_loaded(self):
+        if self.service.loading:
+            messagebox.showinfo("Loading", "The catalog is still loading, please try again in a moment")
+            return False
+        return True
+
+    def on_close(self):
+        self.searcher.shutdown()
+        self.service.close()
+        self.root.destroy()
 
     def setup_ui(self):
         self.menu_bar = tk.Menu(self.root)
@@ -24,7 +101,14 @@ class LibraryGUI:
         self.file_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.file_menu.add_command(label="Manage Books", command=self.show_books_form)
         self.file_menu.add_command(label="Manage Student Cards", command=self.show_student_cards_form)
+        self.file_menu.add_command(label="Loan Statistics", command=self.show_statistics)
         self.menu_bar.add_cascade(label="File", menu=self.file_menu)
+        if INSTRUMENTED:
+            # Only offered when started with LIBRARY_INSTRUMENT=1
+            self.debug_menu = tk.Menu(self.menu_bar, tearoff=0)
+            self.debug_menu.add_command(label="Metrics", accelerator="F12", command=self.show_metrics)
+            self.menu_bar.add_cascade(label="Debug", menu=self.debug_menu)
+            self.root.bind("<F12>", self.show_metrics)
 
         self.frame = tk.Frame(self.root)
         self.frame.pack(pady=20)
@@ -33,6 +117,7 @@ class LibraryGUI:
 
     def show_books_form(self):
         self.clear_frame()
+        self.refresh_search = self.search_books
 
         self.search_label = tk.Label(self.frame, text="Search by")
         self.search_label.grid(row=0, column=0, padx=10, pady=5)
@@ -46,120 +131,170 @@ class LibraryGUI:
         self.search_entry.grid(row=0, column=2, padx=10, pady=5)
         self.search_entry.bind("<KeyRelease>", self.search_books)  # Bind KeyRelease event to search_books
 
-        self.book_listbox = tk.Listbox(self.frame, width=100, height=20)
-        self.book_listbox.grid(row=1, column=0, columnspan=3, padx=10, pady=10)
+        self.filter_frame = tk.Frame(self.frame)
+        self.filter_frame.grid(row=1, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+        tk.Label(self.filter_frame, text="Year from").pack(side=tk.LEFT)
+        self.year_from_entry = tk.Entry(self.filter_frame, width=6)
+        self.year_from_entry.pack(side=tk.LEFT, padx=5)
+        self.year_from_entry.bind("<KeyRelease>", self.search_books)
+        tk.Label(self.filter_frame, text="to").pack(side=tk.LEFT)
+        self.year_to_entry = tk.Entry(self.filter_frame, width=6)
+        self.year_to_entry.pack(side=tk.LEFT, padx=5)
+        self.year_to_entry.bind("<KeyRelease>", self.search_books)
+        self.in_stock = tk.BooleanVar()
+        tk.Checkbutton(self.filter_frame, text="In stock", variable=self.in_stock, command=self.search_books).pack(side=tk.LEFT, padx=10)
+        self.add_fuzzy_control(self.search_books)
+        self.add_sort_controls(("ID", "Title", "Author", "Year", "Quantity"), self.search_books)
+
+        self.book_listbox = VirtualListbox(self.frame, Book.display_info, width=100, height=20)
+        self.book_listbox.grid(row=2, column=0, columnspan=3, padx=10, pady=10)
         self.book_listbox.bind("<Button-3>", self.show_context_menu)  # Bind right-click to show context menu
 
         self.update_book_listbox()
 
         self.add_book_button = tk.Button(self.frame, text="Add Book", command=self.open_add_book_form)
-        self.add_book_button.grid(row=2, column=2, padx=10, pady=5, sticky="e")
+        self.add_book_button.grid(row=3, column=2, padx=10, pady=5, sticky="e")
 
     def show_student_cards_form(self):
         self.clear_frame()
+        self.refresh_search = self.search_students
 
         self.search_label = tk.Label(self.frame, text="Search by")
         self.search_label.grid(row=0, column=0, padx=10, pady=5)
 
         self.search_option = tk.StringVar()
         self.search_option.set("Name")  # Default value
-        self.search_option_menu = tk.OptionMenu(self.frame, self.search_option, "Name", "ID", "Group", "Overdue", command=self.search_students)
+        self.search_option_menu = tk.OptionMenu(self.frame, self.search_option, "Name", "ID", "Group", "Overdue", "Due Within Days", command=self.search_students)
         self.search_option_menu.grid(row=0, column=1, padx=10, pady=5)
 
         self.search_entry = tk.Entry(self.frame)
         self.search_entry.grid(row=0, column=2, padx=10, pady=5)
         self.search_entry.bind("<KeyRelease>", self.search_students)  # Bind KeyRelease event to search_students
 
-        self.student_listbox = tk.Listbox(self.frame, width=100, height=20)
-        self.student_listbox.grid(row=1, column=0, columnspan=3, padx=10, pady=10)
+        self.filter_frame = tk.Frame(self.frame)
+        self.filter_frame.grid(row=1, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+        self.add_fuzzy_control(self.search_students)
+        self.add_sort_controls(("ID", "Name", "Issue Date", "Group"), self.search_students)
+
+        self.student_listbox = VirtualListbox(self.frame, self.card_rows.get, width=100, height=20)
+        self.student_listbox.grid(row=2, column=0, columnspan=3, padx=10, pady=10)
         self.student_listbox.bind("<Button-3>", self.show_student_context_menu)  # Bind right-click to show context menu
 
         self.update_card_listbox()
 
         self.add_card_button = tk.Button(self.frame, text="Add Student", command=self.open_add_card_form)
-        self.add_card_button.grid(row=2, column=2, padx=10, pady=5, sticky="e")
+        self.add_card_button.grid(row=3, column=2, padx=10, pady=5, sticky="e")
 
-    def search_books(self, event=None):
-        search_term = self.search_entry.get().lower()
-        search_option = self.search_option.get()
+    def add_fuzzy_control(self, search):
+        # Also matches misspellings and the other alphabet's spelling, closest matches first
+        self.fuzzy = tk.BooleanVar()
+        tk.Checkbutton(self.filter_frame, text="Fuzzy", variable=self.fuzzy, command=search).pack(side=tk.LEFT, padx=10)
 
-        if search_option == "Title":
-            self.filtered_books = [book for book in self.books if search_term in book.title.lower()]
-        elif search_option == "Author":
-            self.filtered_books = [book for book in self.books if search_term in book.author.lower()]
-        elif search_option == "Year":
-            self.filtered_books = [book for book in self.books if search_term == str(book.year)]
+    def add_sort_controls(self, columns, search):
+        tk.Label(self.filter_frame, text="Sort by").pack(side=tk.LEFT)
+        self.sort_option = tk.StringVar()
+        self.sort_option.set("Default")  # Catalog order, or earliest due date first for the loan searches
+        tk.OptionMenu(self.filter_frame, self.sort_option, "Default", *columns, command=search).pack(side=tk.LEFT, padx=5)
+        self.descending = tk.BooleanVar()
+        tk.Checkbutton(self.filter_frame, text="Descending", variable=self.descending, command=search).pack(side=tk.LEFT)
 
-        self.update_book_listbox()
+    def sort_by(self):
+        return None if self.sort_option.get() == "Default" else self.sort_option.get().lower()
+
+    def year_bound(self, text):
+        text = text.strip()
+        return int(text) if text.lstrip('-').isdigit() else None
 
+    @instrumented("gui.search_books")
+    def search_books(self, event=None):
+        search_term = self.search_entry.get().lower()
+        search_option = self.search_option.get()
+        keep_position = event is None
+        # Read on the Tk thread; the query itself runs on the search worker
+        year_range = (self.year_bound(self.year_from_entry.get()), self.year_bound(self.year_to_entry.get()))
+        options = {"year_range": year_range, "in_stock": self.in_stock.get(), "fuzzy": self.fuzzy.get(),
+                   "sort_by": self.sort_by(), "descending": self.descending.get()}
+        self.searcher.submit(lambda cancelled: self.filter_books(search_option, search_term, options, cancelled),
+                             lambda books: self.show_filtered_books(books, keep_position), debounce=event is not None)
+
+    @instrumented("gui.filter_books")
+    def filter_books(self, search_option, search_term, options, cancelled):
+        return self.service.search_books(search_option.lower(), search_term, cancelled, **options)
+
+    @instrumented("gui.show_filtered_books")
+    def show_filtered_books(self, books, keep_position):
+        self.filtered_books = books
+        self.update_book_listbox(keep_position)
+
+    @instrumented("gui.search_students")
     def search_students(self, event=None):
         search_term = self.search_entry.get().lower()
         search_option = self.search_option.get()
+        keep_position = event is None
+        options = {"fuzzy": self.fuzzy.get(), "sort_by": self.sort_by(), "descending": self.descending.get()}
+        self.searcher.submit(lambda cancelled: self.filter_students(search_option, search_term, options, cancelled),
+                             lambda cards: self.show_filtered_students(cards, keep_position), debounce=event is not None)
 
-        if search_option == "Name":
-            self.filtered_students = [card for card in self.student_cards if search_term in card.student_name.lower()]
-        elif search_option == "ID":
-            self.filtered_students = [card for card in self.student_cards if search_term == str(card.id)]
-        elif search_option == "Group":
-            self.filtered_students = [card for card in self.student_cards if search_term in card.group.lower()]
-        elif search_option == "Overdue":
-            self.filtered_students = self.get_overdue_students()
+    @instrumented("gui.filter_students")
+    def filter_students(self, search_option, search_term, options, cancelled):
+        return self.service.search_cards(search_option.lower(), search_term, cancelled, **options)
 
-        self.update_card_listbox()
+    @instrumented("gui.show_filtered_students")
+    def show_filtered_students(self, cards, keep_position):
+        self.filtered_students = cards
+        self.update_card_listbox(keep_position)
 
+    @instrumented("gui.write.add_book")
     def add_book(self, title, author, year, quantity):
-        if not title or not author or not year or not quantity:
-            messagebox.showerror("Error", "All fields must be filled out")
+        if not self.check_loaded():
             return
 
+        # Writes take the service's write lock on this thread; a cancelled search stops its filter pass
+        # and lets go of the read lock instead of running to the end
+        self.searcher.cancel()
         try:
-            year = int(year)
-            quantity = int(quantity)
-        except ValueError:
-            messagebox.showerror("Error", "Year and Quantity must be integers")
+            self.service.add_book(title, author, year, quantity)
+        except ValidationError as e:
+            messagebox.showerror("Error", str(e))
             return
+        self.search_books()
 
-        new_book = Book(id=len(self.books) + 1, title=title, author=author, year=year, quantity=quantity)
-        self.books.append(new_book)
-        write_books_to_file("books.txt", self.books)
-        self.update_book_listbox()
-
+    @instrumented("gui.write.add_card")
     def add_card(self, name, issue_date, group, borrowed_books):
-        if not name or not issue_date or not group:
-            messagebox.showerror("Error", "All fields must be filled out")
+        if not self.check_loaded():
             return
 
-        new_card = StudentCard(id=len(self.student_cards) + 1, title="Student Card", student_name=name, issue_date=issue_date, group=group, borrowed_books=borrowed_books)
-        self.student_cards.append(new_card)
-        write_student_cards_to_file("students.txt", self.student_cards)
-        self.update_card_listbox()
+        self.searcher.cancel()
+        try:
+            self.service.add_card(name, issue_date, group, borrowed_books)
+        except ValidationError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.search_students()
+
+    @instrumented("gui.update_book_listbox")
+    def update_book_listbox(self, keep_position=False):
+        self.book_listbox.set_records(self.filtered_books, keep_position)
+
+    @instrumented("gui.update_card_listbox")
+    def update_card_listbox(self, keep_position=False):
+        self.sync_card_rows()
+        self.student_listbox.set_records(self.filtered_students, keep_position)
+
+    def sync_card_rows(self):
+        # Drop only the cached rows of cards that were written, or that show a book that was
+        self.seen_version, changes = self.service.changes_since(self.seen_version)
+        if changes is None:
+            self.card_rows.clear()
+            return
+        for kind, record_id in changes:
+            if kind == "book":
+                self.card_rows.invalidate_references(record_id)
+            else:
+                self.card_rows.invalidate(record_id)
 
-    def update_book_listbox(self):
-        self.book_listbox.delete(0, tk.END)
-        for book in self.filtered_books:
-            self.book_listbox.insert(tk.END, book.display_info())
-
-    def update_card_listbox(self):
-        self.student_listbox.delete(0, tk.END)
-        for card in self.filtered_students:
-            borrowed_books_info = card.get_borrowed_books_info(self.books)
-            borrowed_books_text = ", ".join([f"{book_name} (Due: {due_date})" for book_name, due_date in borrowed_books_info])
-            display_text = f"ID: {card.id} | Name: {card.student_name} | Issue Date: {card.issue_date} | Group: {card.group} | Borrowed Books: {borrowed_books_text}"
-            self.student_listbox.insert(tk.END, display_text)
-
-    def get_overdue_students(self):
-        overdue_students = []
-        today = datetime.today().date()
-
-        for student in self.student_cards:
-            for book in student.borrowed_books:
-                for due_date in book.values():
-                    if datetime.strptime(due_date, '%Y-%m-%d').date() < today:
-                        if student not in overdue_students:
-                            overdue_students.append(student)
-                        break  # Exit inner loop once an overdue book is found for this student
-
-        return overdue_students
+    def format_card(self, card):
+        return card_row(card, self.service.borrowed_books_info(card))
 
     def open_add_book_form(self):
         self.add_book_window = tk.Toplevel(self.root)
@@ -211,6 +346,7 @@ class LibraryGUI:
         self.borrowed_books_frame = tk.Frame(self.add_card_window)
         self.borrowed_books_frame.grid(row=3, column=1, padx=10, pady=5)
         self.borrowed_books = []
+        self.book_choices = self.service.book_ids_by_title()
 
         self.add_borrowed_book_row()
 
@@ -224,7 +360,7 @@ class LibraryGUI:
         row_frame = tk.Frame(self.borrowed_books_frame)
         row_frame.pack(fill=tk.X, pady=2)
 
-        book_menu = ttk.Combobox(row_frame, textvariable=book_var, values=[book.title for book in self.books])
+        book_menu = ttk.Combobox(row_frame, textvariable=book_var, values=list(self.book_choices))
         book_menu.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
         date_entry = tk.Entry(row_frame, textvariable=date_var)
@@ -243,10 +379,13 @@ class LibraryGUI:
         name = self.new_card_name_entry.get()
         issue_date = self.new_card_issue_date_entry.get()
         group = self.new_card_group_entry.get()
-        borrowed_books = [{str(self.books[i].id): date_var.get()} for i, (book_var, date_var, _) in enumerate(self.borrowed_books) if book_var.get() and date_var.get()]
+        borrowed_books = self.collect_borrowed_books()
         self.add_card(name, issue_date, group, borrowed_books)
         self.add_card_window.destroy()
 
+    def collect_borrowed_books(self):
+        return [{str(self.book_choices[book_var.get()]): date_var.get()} for book_var, date_var, _ in self.borrowed_books if book_var.get() in self.book_choices and date_var.get()]
+
     def show_context_menu(self, event):
         context_menu = tk.Menu(self.root, tearoff=0)
         context_menu.add_command(label="Edit", command=lambda: self.edit_book(event))
@@ -263,8 +402,12 @@ class LibraryGUI:
         selected_index = self.book_listbox.curselection()
         if not selected_index:
             return
+        if not self.check_loaded():
+            return
         selected_index = selected_index[0]
         selected_book = self.filtered_books[selected_index]
+        # Saving fails if another desk writes the book while the form is open
+        version = self.service.book_version(selected_book.id)
 
         self.edit_book_window = tk.Toplevel(self.root)
         self.edit_book_window.title("Edit Book")
@@ -289,48 +432,54 @@ class LibraryGUI:
         self.edit_book_quantity_entry.grid(row=3, column=1, padx=10, pady=5)
         self.edit_book_quantity_entry.insert(0, selected_book.quantity)
 
-        tk.Button(self.edit_book_window, text="Save", command=lambda: self.confirm_edit_book(selected_index)).grid(row=4, column=1, padx=10, pady=10)
+        tk.Button(self.edit_book_window, text="Save", command=lambda: self.confirm_edit_book(selected_book.id, version)).grid(row=4, column=1, padx=10, pady=10)
 
-    def confirm_edit_book(self, index):
+    @instrumented("gui.write.edit_book")
+    def confirm_edit_book(self, book_id, version=None):
         title = self.edit_book_title_entry.get()
         author = self.edit_book_author_entry.get()
         year = self.edit_book_year_entry.get()
         quantity = self.edit_book_quantity_entry.get()
 
-        if not title or not author or not year or not quantity:
-            messagebox.showerror("Error", "All fields must be filled out")
-            return
-
+        self.searcher.cancel()
         try:
-            year = int(year)
-            quantity = int(quantity)
-        except ValueError:
-            messagebox.showerror("Error", "Year and Quantity must be integers")
+            self.service.update_book(book_id, title, author, year, quantity, version)
+        except ValidationError as e:
+            messagebox.showerror("Error", str(e))
             return
-
-        self.books[index].title = title
-        self.books[index].author = author
-        self.books[index].year = year
-        self.books[index].quantity = quantity
-        write_books_to_file("books.txt", self.books)
-        self.update_book_listbox()
+        except KeyError:
+            messagebox.showerror("Error", "This book has been deleted")
+        except ConflictError:
+            messagebox.showerror("Error", "This book was changed at another desk meanwhile, your changes were not saved")
+        self.search_books()
         self.edit_book_window.destroy()
 
+    @instrumented("gui.write.delete_book")
     def delete_book(self, event):
         selected_index = self.book_listbox.curselection()
         if not selected_index:
             return
-        selected_index = selected_index[0]
-        del self.books[selected_index]
-        write_books_to_file("books.txt", self.books)
-        self.update_book_listbox()
+        if not self.check_loaded():
+            return
+        selected_book = self.filtered_books[selected_index[0]]
+        self.searcher.cancel()
+        try:
+            self.service.delete_book(selected_book.id)
+        except KeyError:
+            pass  # Already deleted elsewhere, the refresh below drops it from the list
+        except ValidationError as e:
+            messagebox.showerror("Error", str(e))
+        self.search_books()
 
     def edit_card(self, event):
         selected_index = self.student_listbox.curselection()
         if not selected_index:
             return
+        if not self.check_loaded():
+            return
         selected_index = selected_index[0]
         selected_card = self.filtered_students[selected_index]
+        version = self.service.card_version(selected_card.id)
 
         self.edit_card_window = tk.Toplevel(self.root)
         self.edit_card_window.title("Edit Student")
@@ -354,50 +503,77 @@ class LibraryGUI:
         self.borrowed_books_frame = tk.Frame(self.edit_card_window)
         self.borrowed_books_frame.grid(row=3, column=1, padx=10, pady=5)
         self.borrowed_books = []
+        self.book_choices = self.service.book_ids_by_title()
 
-        for book in selected_card.borrowed_books:
-            for book_id, due_date in book.items():
-                book_var = tk.StringVar(value=next((b.title for b in self.books if b.id == int(book_id)), ""))
-                date_var = tk.StringVar(value=due_date)
-                self.add_borrowed_book_row(book_var, date_var)
+        for book_name, due_date in self.service.borrowed_books_info(selected_card):
+            book_var = tk.StringVar(value=book_name if book_name in self.book_choices else "")
+            date_var = tk.StringVar(value=due_date.isoformat())
+            self.add_borrowed_book_row(book_var, date_var)
 
         tk.Button(self.edit_card_window, text="Add Book", command=self.add_borrowed_book_row).grid(row=4, column=1, padx=10, pady=5)
-        tk.Button(self.edit_card_window, text="Save", command=lambda: self.confirm_edit_card(selected_index)).grid(row=5, column=1, padx=10, pady=10)
+        tk.Button(self.edit_card_window, text="Save", command=lambda: self.confirm_edit_card(selected_card.id, version)).grid(row=5, column=1, padx=10, pady=10)
 
-    def confirm_edit_card(self, index):
+    @instrumented("gui.write.edit_card")
+    def confirm_edit_card(self, card_id, version=None):
         name = self.edit_card_name_entry.get()
         issue_date = self.edit_card_issue_date_entry.get()
         group = self.edit_card_group_entry.get()
-        borrowed_books = [{str(self.books[i].id): date_var.get()} for i, (book_var, date_var, _) in enumerate(self.borrowed_books) if book_var.get() and date_var.get()]
+        borrowed_books = self.collect_borrowed_books()
 
-        if not name or not issue_date or not group:
-            messagebox.showerror("Error", "All fields must be filled out")
+        self.searcher.cancel()
+        try:
+            self.service.update_card(card_id, name, issue_date, group, borrowed_books, version)
+        except ValidationError as e:
+            messagebox.showerror("Error", str(e))
             return
-
-        self.student_cards[index].student_name = name
-        self.student_cards[index].issue_date = issue_date
-        self.student_cards[index].group = group
-        self.student_cards[index].borrowed_books = borrowed_books
-        write_student_cards_to_file("students.txt", self.student_cards)
-        self.update_card_listbox()
+        except KeyError:
+            messagebox.showerror("Error", "This student card has been deleted")
+        except ConflictError:
+            messagebox.showerror("Error", "This student card was changed at another desk meanwhile, your changes were not saved")
+        self.search_students()
         self.edit_card_window.destroy()
 
+    @instrumented("gui.write.delete_card")
     def delete_card(self, event):
         selected_index = self.student_listbox.curselection()
         if not selected_index:
             return
-        selected_index = selected_index[0]
-        del self.student_cards[selected_index]
-        write_student_cards_to_file("students.txt", self.student_cards)
-        self.update_card_listbox()
+        if not self.check_loaded():
+            return
+        selected_card = self.filtered_students[selected_index[0]]
+        self.searcher.cancel()
+        try:
+            self.service.delete_card(selected_card.id)
+        except KeyError:
+            pass  # Already deleted elsewhere, the refresh below drops it from the list
+        self.search_students()
+
+    def show_metrics(self, event=None):
+        MetricsWindow(self.root)
+
+    def show_statistics(self):
+        if self.check_loaded():
+            StatisticsWindow(self.root, self.service)
 
     def clear_frame(self):
+        self.searcher.cancel()
         for widget in self.frame.winfo_children():
             widget.destroy()
         self.frame.pack_forget()
         self.frame.pack(pady=20)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Library Management System")
+    parser.add_argument("--sqlite", metavar="DATABASE", help="use an SQLite catalog instead of books.txt and students.txt")
+    parser.add_argument("--server", metavar="URL", help="use a catalog served by library_server, e.g. http://127.0.0.1:8080")
+    parser.add_argument("--columns", action="store_true", help="keep books.txt and students.txt in a column store: less memory, slower searches")
+    args = parser.parse_args()
+
+    if args.server:
+        service = LibraryClient(args.server)
+    else:
+        service = LibraryService(SqliteBackend(args.sqlite) if args.sqlite else TextFileBackend(columns=args.columns))
+    start_periodic_dump()
     root = tk.Tk()
-    app = LibraryGUI(root)
+    app = LibraryGUI(root, service)
     root.mainloop()
@@ -1,6 +1,20 @@
 import json
+from collections import namedtuple
+from datetime import datetime
+from instrumentation import instrumented
+
+Loan = namedtuple("Loan", ["book_id", "due_date"])
+
+def parse_date(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').date()
+
+@instrumented("model.parse_loans")
+def parse_loans(borrowed_books):
+    return [Loan(int(book_id), parse_date(due_date)) for book in borrowed_books for book_id, due_date in book.items()]
 
 class Item:
+    __slots__ = ("id", "title")
+
     def __init__(self, id, title):
         self.id = id
         self.title = title
@@ -10,6 +24,8 @@ class Item:
 
 
 class Book(Item):
+    __slots__ = ("author", "year", "quantity")
+
     def __init__(self, id, title, author, year, quantity):
         super().__init__(id, title)
         self.author = author
@@ -20,6 +36,7 @@ class Book(Item):
         return f"ID: {self.id} | Title: {self.title} | Author: {self.author} | Year: {self.year} | Quantity: {self.quantity}"
 
     @staticmethod
+    @instrumented("model.book_from_string")
     def from_string(book_str):
         parts = book_str.strip().split(" | ")
         if len(parts) != 5:
@@ -30,6 +47,8 @@ class Book(Item):
         return f"{self.id} | {self.title} | {self.author} | {self.year} | {self.quantity}"
 
 class StudentCard(Item):
+    __slots__ = ("student_name", "issue_date", "group", "_loans", "raw_borrowed_books")
+
     def __init__(self, id, title, student_name, issue_date, group, borrowed_books=None):
         super().__init__(id, title)
         self.student_name = student_name
@@ -37,24 +56,57 @@ class StudentCard(Item):
         self.group = group
         self.borrowed_books = borrowed_books if borrowed_books is not None else []
 
+    @property
+    def borrowed_books(self):
+        return [{str(loan.book_id): loan.due_date.isoformat()} for loan in self.loans]
+
+    @borrowed_books.setter
+    def borrowed_books(self, borrowed_books):
+        # Due dates are parsed once here, so overdue checks compare date objects directly
+        self._loans = parse_loans(borrowed_books)
+        self.raw_borrowed_books = None
+
+    @property
+    def loans(self):
+        if self._loans is None:
+            try:
+                self._loans = parse_loans(json.loads(self.raw_borrowed_books))
+            except (ValueError, AttributeError) as e:
+                print(f"Invalid borrowed books for card {self.id}: {e}")
+                self._loans = []
+        return self._loans
+
+    def set_loans(self, loans):
+        self._loans = loans
+        self.raw_borrowed_books = None
+
+    def set_raw_borrowed_books(self, raw_borrowed_books):
+        # Kept as JSON text until first read, and written back verbatim if never touched
+        self._loans = None
+        self.raw_borrowed_books = raw_borrowed_books
+
     def display_info(self):
         return f"ID: {self.id} | Name: {self.student_name} | Issue Date: {self.issue_date} | Group: {self.group}"
 
     @staticmethod
+    @instrumented("model.card_from_string")
     def from_string(card_str):
         parts = card_str.strip().split(" | ")
         if len(parts) != 5:
             raise ValueError(f"Invalid card string: {card_str}")
-        borrowed_books = json.loads(parts[4])
-        return StudentCard(int(parts[0]), "Student Card", parts[1], parts[2], parts[3], borrowed_books)
+        card = StudentCard(int(parts[0]), "Student Card", parts[1], parts[2], parts[3])
+        card.set_raw_borrowed_books(parts[4])
+        return card
 
     def to_string(self):
-        return f"{self.id} | {self.student_name} | {self.issue_date} | {self.group} | {json.dumps(self.borrowed_books)}"
+        return f"{self.id} | {self.student_name} | {self.issue_date} | {self.group} | {self.borrowed_books_json()}"
+
+    def borrowed_books_json(self):
+        return self.raw_borrowed_books if self.raw_borrowed_books is not None else json.dumps(self.borrowed_books)
 
     def get_borrowed_books_info(self, books):
         borrowed_books_info = []
-        for book in self.borrowed_books:
-            for book_id, due_date in book.items():
-                book_name = next((b.title for b in books if b.id == int(book_id)), "Unknown")
-                borrowed_books_info.append((book_name, due_date))
+        for loan in self.loans:
+            borrowed_book = books.get(loan.book_id)
+            borrowed_books_info.append((borrowed_book.title if borrowed_book else "Unknown", loan.due_date))
         return borrowed_books_info
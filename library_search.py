@@ -0,0 +1,325 @@
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain
+from transliteration import normalize
+
+# Authors, groups and names repeat across many records, so their keys are normalized once while they keep coming up
+search_key = lru_cache(maxsize=4096)(normalize)
+
+class TextIndex:
+    # Records by the normalized text of one field. Subclasses index the distinct texts rather than the records:
+    # a field such as the author or the group holds the same few texts over and over, and postings of records
+    # would grow with every one of them
+    def __init__(self, key):
+        self.key = key
+        self.texts = {}
+        self.records = {}
+        # Searches run on a worker thread while edits arrive from the Tk thread
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.add_text(record.id, search_key(self.key(record)))
+
+    def add_text(self, record_id, text):
+        self.texts[record_id] = text
+        record_ids = self.records.get(text)
+        if record_ids is None:
+            self.records[text] = [record_id]
+            self.index_text(text)
+        else:
+            record_ids.append(record_id)
+
+    def remove(self, record_id):
+        with self.lock:
+            self.remove_text(record_id)
+
+    def remove_text(self, record_id):
+        text = self.texts.pop(record_id, None)
+        if text is None:
+            return
+        record_ids = self.records[text]
+        record_ids.remove(record_id)
+        if not record_ids:
+            del self.records[text]
+            self.unindex_text(text)
+
+    def update(self, record):
+        text = search_key(self.key(record))
+        with self.lock:
+            if self.texts.get(record.id) == text:
+                return
+            self.remove_text(record.id)
+            self.add_text(record.id, text)
+
+    def index_text(self, text):
+        pass
+
+    def unindex_text(self, text):
+        pass
+
+    def record_ids(self, texts):
+        # Each record holds one text, so the IDs come out once each, in no particular order
+        return list(chain.from_iterable(map(self.records.__getitem__, texts)))
+
+
+class NGramIndex(TextIndex):
+    N = 3
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.postings = defaultdict(set)
+        self.last_query = None
+        self.last_texts = None
+
+    def ngrams(self, text):
+        # Trigrams only: nearly every record holds some letter or letter pair, so their postings would cost
+        # far more memory than the records while narrowing nothing
+        return {text[start:start + self.N] for start in range(len(text) - self.N + 1)}
+
+    def index_text(self, text):
+        postings = self.postings
+        for gram in self.ngrams(text):
+            postings[gram].add(text)
+        self.last_query = None
+
+    def unindex_text(self, text):
+        for gram in self.ngrams(text):
+            posting = self.postings[gram]
+            posting.discard(text)
+            if not posting:
+                del self.postings[gram]
+        self.last_query = None
+
+    def search(self, query):
+        # IDs of the records whose key holds the query, in no particular order
+        with self.lock:
+            return self.search_locked(normalize(query))
+
+    def search_locked(self, query):
+        if not query:
+            return list(self.texts)
+        if len(query) < self.N:
+            # A letter or two matches most records, which one pass over them gathers faster than the texts' lists
+            self.last_query = None
+            return [record_id for record_id, text in self.texts.items() if query in text]
+        if self.last_query and self.last_query in query:
+            # The query grew by a keystroke, so every match is already among the previous matches
+            texts = [text for text in self.last_texts if query in text]
+        else:
+            texts = self.candidates(query)
+        self.last_query = query
+        self.last_texts = texts
+        return self.record_ids(texts)
+
+    def candidates(self, query):
+        # Every match holds the query's rarest trigram, and confirming the substring on those texts costs
+        # no more than intersecting them with the other trigrams' postings would
+        grams = [self.postings.get(query[start:start + self.N], ()) for start in range(len(query) - self.N + 1)]
+        return [text for text in min(grams, key=len) if query in text]
+
+    def word_index(self):
+        # A word index over the same texts, which are already normalized
+        index = WordIndex(self.key)
+        with self.lock:
+            index.texts = dict(self.texts)
+            index.records = {text: list(record_ids) for text, record_ids in self.records.items()}
+        for text in index.records:
+            index.index_text(text)
+        return index
+
+
+def padded_trigrams(word):
+    padded = f"  {word}  "
+    return {padded[start:start + 3] for start in range(len(word) + 2)}
+
+def swapped_spellings(word):
+    return {word[:i] + word[i + 1] + word[i] + word[i + 2:] for i in range(len(word) - 1) if word[i] != word[i + 1]}
+
+def typo_limit(word):
+    # Edits tolerated in a query word; very short words must match exactly
+    return 0 if len(word) <= 2 else 1 if len(word) <= 5 else 2
+
+def edit_distance(first, second, limit):
+    # Damerau-Levenshtein distance (adjacent transpositions count once), or None once it must exceed limit
+    if abs(len(first) - len(second)) > limit:
+        return None
+    before_previous = None
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i] + [0] * len(second)
+        for j, second_char in enumerate(second, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char))
+            if i > 1 and j > 1 and first_char == second[j - 2] and first[i - 2] == second_char:
+                distance = min(distance, before_previous[j - 2] + 1)
+            current[j] = distance
+        if min(current) > limit:
+            return None
+        before_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+class WordIndex(TextIndex):
+    # Texts by their words, plus a trigram index over the distinct words, so the words within an edit
+    # or two of a misspelt query word are found without comparing it to the whole vocabulary
+    def __init__(self, key):
+        super().__init__(key)
+        self.postings = {}
+        self.word_grams = defaultdict(set)
+
+    def index_text(self, text):
+        for word in set(text.split()):
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = set()
+                for gram in padded_trigrams(word):
+                    self.word_grams[gram].add(word)
+            posting.add(text)
+
+    def unindex_text(self, text):
+        for word in set(text.split()):
+            posting = self.postings[word]
+            posting.discard(text)
+            if posting:
+                continue
+            del self.postings[word]
+            for gram in padded_trigrams(word):
+                words = self.word_grams[gram]
+                words.discard(word)
+                if not words:
+                    del self.word_grams[gram]
+
+    def similar_words(self, word):
+        # (indexed word, edits) pairs for the words within the query word's typo limit
+        limit = typo_limit(word)
+        if not limit:
+            return [(word, 0)] if word in self.postings else []
+        matches = []
+        for candidate in self.candidates(word, limit):
+            distance = edit_distance(word, candidate, limit)
+            if distance is not None:
+                matches.append((candidate, distance))
+        return matches
+
+    def candidates(self, word, limit):
+        # A substitution, insertion or deletion changes at most three of a word's padded trigrams, so a word
+        # within `limit` of those shares at least this many with the query; only those are compared letter by letter
+        grams = padded_trigrams(word)
+        needed = len(grams) - 3 * limit
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.word_grams.get(gram, ()))
+        found = {candidate for candidate, count in shared.items() if count >= needed}
+        # Two swapped letters change four trigrams, which would loosen that bound for every query; instead the
+        # words that need a swap are looked for from each swapped spelling, with one edit less to spend
+        for swapped in swapped_spellings(word):
+            found.update(self.swap_candidates(swapped, limit - 1, grams, shared, needed))
+        return found
+
+    def swap_candidates(self, word, limit, query_grams, shared, query_needed):
+        if not limit:
+            return [word] if word in self.postings else []
+        grams = padded_trigrams(word)
+        needed = len(grams) - 3 * limit
+        # A word shares no more trigrams with this spelling than it does with the query plus this spelling's
+        # new ones, so only the holders of a new one can pass that were not already found from the query
+        added = Counter()
+        for gram in grams - query_grams:
+            added.update(self.word_grams.get(gram, ()))
+        found = {candidate for candidate, count in added.items() if shared[candidate] + count >= needed}
+        if needed < query_needed:
+            found.update(candidate for candidate, count in shared.items() if count >= needed)
+        for swapped in swapped_spellings(word):
+            found.update(self.swap_candidates(swapped, limit - 1, query_grams, shared, query_needed))
+        return found
+
+    def search(self, query, skip_substrings=False):
+        # IDs of the records that hold every query word or a near spelling of it, fewest edits first;
+        # a query word spelt like nothing in the index is left out rather than emptying the result.
+        # skip_substrings leaves out the records whose key holds the whole query, for callers that
+        # have those from a substring search already
+        query = normalize(query)
+        with self.lock:
+            word_matches = [matches for matches in map(self.similar_words, query.split()) if matches]
+            if not word_matches:
+                return []
+            postings = self.postings
+            # The rarest word picks the candidates, and every other word only filters them, in C
+            word_matches.sort(key=lambda matches: sum(len(postings[word]) for word, _ in matches))
+            texts = set().union(*(postings[word] for word, _ in word_matches[0]))
+            if skip_substrings:
+                texts = {text for text in texts if query not in text}
+            for matches in word_matches[1:]:
+                texts = set().union(*(texts & postings[word] for word, _ in matches))
+            # A text's cost for a query word is its closest spelling of it; exact matches cost nothing
+            costs = Counter(dict.fromkeys(texts, 0))
+            for matches in word_matches:
+                found = set()
+                for word, distance in sorted(matches, key=lambda match: match[1]):
+                    hits = texts & postings[word]
+                    for _ in range(distance):
+                        costs.update(hits - found)
+                    found |= hits
+            by_cost = defaultdict(list)
+            for text, cost in costs.items():
+                by_cost[cost].append(text)
+            return [record_id for cost in sorted(by_cost) for record_id in sorted(self.record_ids(by_cost[cost]))]
+
+
+class SearchIndex:
+    def __init__(self, fields):
+        self.fields = {name: NGramIndex(key) for name, key in fields.items()}
+        # Typo-tolerant word indexes cost as much again, so each is built on the first fuzzy search of its field
+        self.words = {}
+
+    def indexes(self):
+        return list(self.fields.values()) + list(self.words.values())
+
+    def add(self, record):
+        for index in self.indexes():
+            index.add(record)
+
+    def remove(self, record_id):
+        for index in self.indexes():
+            index.remove(record_id)
+
+    def update(self, record):
+        for index in self.indexes():
+            index.update(record)
+
+    def search(self, field, query):
+        return self.fields[field].search(query)
+
+    def fuzzy_search(self, field, query):
+        # Substring matches first, in ID order, then the records that only match allowing for typos, closest first
+        return sorted(self.search(field, query)) + self.word_index(field).search(query, skip_substrings=True)
+
+    def word_index(self, field):
+        if field not in self.words:
+            self.words[field] = self.fields[field].word_index()
+        return self.words[field]
+
+
+BOOK_FIELDS = {"title": lambda book: book.title, "author": lambda book: book.author}
+CARD_FIELDS = {"name": lambda card: card.student_name, "group": lambda card: card.group}
+
+def book_search_index(books):
+    index = SearchIndex(BOOK_FIELDS)
+    for book in books:
+        index.add(book)
+    return index
+
+def card_search_index(cards):
+    index = SearchIndex(CARD_FIELDS)
+    for card in cards:
+        index.add(card)
+    return index
+
+def word_indexes(fields, records):
+    # Just the typo-tolerant half, for backends that already search substrings themselves
+    indexes = {name: WordIndex(key) for name, key in fields.items()}
+    for record in records:
+        for index in indexes.values():
+            index.add(record)
+    return indexes
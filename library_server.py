@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import functools
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from library_file_handler import TextFileBackend, ConflictError
+from library_sqlite import SqliteBackend
+from library_service import LibraryService, ValidationError
+from instrumentation import start_periodic_dump
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error"}
+PAGE_LIMIT = 1000
+SYNC_INTERVAL = 1
+
+
+def book_to_dict(book):
+    return {"id": book.id, "title": book.title, "author": book.author, "year": book.year, "quantity": book.quantity}
+
+def card_to_dict(card, borrowed_books_info):
+    return {"id": card.id, "student_name": card.student_name, "issue_date": card.issue_date, "group": card.group,
+            "borrowed_books": card.borrowed_books,
+            "borrowed_books_info": [[book_name, due_date.isoformat()] for book_name, due_date in borrowed_books_info]}
+
+def parse_body(body):
+    data = json.loads(body) if body else {}
+    if not isinstance(data, dict):
+        raise ValidationError("The request body must be a JSON object")
+    return data
+
+def expected_version(values):
+    # From the query string of a DELETE or the JSON body of a PUT, where it may arrive as a string too
+    if values.get("expected_version") is None:
+        return None
+    try:
+        return int(values["expected_version"])
+    except (TypeError, ValueError):
+        raise ValidationError("expected_version must be an integer")
+
+
+class LibraryServer:
+    def __init__(self, service, workers=8):
+        self.service = service
+        # Service calls block, so they run on a thread pool; the service lock lets readers overlap and serializes writers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="library-request")
+        self.routes = [
+            ("GET", r"/status", self.status),
+            ("GET", r"/books", self.search_books),
+            ("POST", r"/books", self.add_book),
+            ("GET", r"/books/titles", self.book_titles),
+            ("GET", r"/books/(\d+)", self.get_book),
+            ("PUT", r"/books/(\d+)", self.update_book),
+            ("DELETE", r"/books/(\d+)", self.delete_book),
+            ("GET", r"/cards", self.search_cards),
+            ("POST", r"/cards", self.add_card),
+            ("GET", r"/cards/(\d+)", self.get_card),
+            ("PUT", r"/cards/(\d+)", self.update_card),
+            ("DELETE", r"/cards/(\d+)", self.delete_card),
+            ("POST", r"/loans", self.lend_and_return),
+            ("GET", r"/books/(\d+)/availability", self.book_availability),
+            ("GET", r"/stats/top-borrowed", self.top_borrowed),
+            ("GET", r"/stats/groups", self.group_stats),
+        ]
+
+    def card_to_dict(self, card):
+        return card_to_dict(card, self.service.borrowed_books_info(card))
+
+    def versioned_book(self, book):
+        # Single-record responses carry the version a later PUT or DELETE can send back as expected_version
+        return dict(book_to_dict(book), version=self.service.book_version(book.id))
+
+    def versioned_card(self, card):
+        return dict(self.card_to_dict(card), version=self.service.card_version(card.id))
+
+    def page(self, records, query, to_dict):
+        offset = int(query.get("offset", 0))
+        limit = min(int(query.get("limit", 100)), PAGE_LIMIT)
+        return 200, {"total": len(records), "offset": offset, "items": [to_dict(record) for record in records[offset:offset + limit]]}
+
+    def status(self, query, body):
+        return 200, {"loading": self.service.loading, "books": self.service.count_books(), "cards": self.service.count_cards()}
+
+    def search_books(self, query, body):
+        year_range = (int(query["year_from"]) if "year_from" in query else None, int(query["year_to"]) if "year_to" in query else None)
+        books = self.service.search_books(query.get("field", "title"), query.get("term", ""), None, year_range,
+                                          query.get("in_stock") == "1", query.get("sort"), query.get("descending") == "1", query.get("fuzzy") == "1")
+        return self.page(books, query, book_to_dict)
+
+    def book_titles(self, query, body):
+        return 200, self.service.book_ids_by_title()
+
+    def get_book(self, query, body, book_id):
+        book = self.service.get_book(int(book_id))
+        if book is None:
+            raise KeyError(book_id)
+        return 200, self.versioned_book(book)
+
+    def add_book(self, query, body):
+        book = self.service.add_book(body.get("title"), body.get("author"), body.get("year"), body.get("quantity"))
+        return 201, self.versioned_book(book)
+
+    def update_book(self, query, body, book_id):
+        book = self.service.update_book(int(book_id), body.get("title"), body.get("author"), body.get("year"), body.get("quantity"),
+                                         expected_version(body))
+        return 200, self.versioned_book(book)
+
+    def delete_book(self, query, body, book_id):
+        self.service.delete_book(int(book_id), expected_version(query))
+        return 200, {"deleted": int(book_id)}
+
+    def search_cards(self, query, body):
+        cards = self.service.search_cards(query.get("field", "name"), query.get("term", ""), None, query.get("sort"), query.get("descending") == "1",
+                                          query.get("fuzzy") == "1")
+        return self.page(cards, query, self.card_to_dict)
+
+    def get_card(self, query, body, card_id):
+        card = self.service.get_card(int(card_id))
+        if card is None:
+            raise KeyError(card_id)
+        return 200, self.versioned_card(card)
+
+    def add_card(self, query, body):
+        card = self.service.add_card(body.get("student_name"), body.get("issue_date"), body.get("group"), body.get("borrowed_books", []))
+        return 201, self.versioned_card(card)
+
+    def update_card(self, query, body, card_id):
+        card = self.service.update_card(int(card_id), body.get("student_name"), body.get("issue_date"), body.get("group"), body.get("borrowed_books", []),
+                                         expected_version(body))
+        return 200, self.versioned_card(card)
+
+    def delete_card(self, query, body, card_id):
+        self.service.delete_card(int(card_id), expected_version(query))
+        return 200, {"deleted": int(card_id)}
+
+    def lend_and_return(self, query, body):
+        try:
+            checkouts = [(int(item["card_id"]), int(item["book_id"]), item.get("due_date")) for item in body.get("checkout", [])]
+            returns = [(int(item["card_id"]), int(item["book_id"])) for item in body.get("return", [])]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed loan: {e}")
+        cards = self.service.lend_and_return(checkouts, returns)
+        return 200, {"cards": [self.card_to_dict(card) for card in cards]}
+
+    def book_availability(self, query, body, book_id):
+        book = self.service.get_book(int(book_id))
+        if book is None:
+            raise KeyError(book_id)
+        outstanding = self.service.outstanding_loans(book.id)
+        return 200, {"id": book.id, "quantity": book.quantity, "outstanding": outstanding, "available": book.quantity - outstanding}
+
+    def top_borrowed(self, query, body):
+        top = self.service.top_borrowed(min(int(query.get("count", 10)), PAGE_LIMIT))
+        return 200, [{"book": book_to_dict(book) if book is not None else None, "outstanding": outstanding} for book, outstanding in top]
+
+    def group_stats(self, query, body):
+        return 200, [{"group": group, "cards": cards, "loans": loans} for group, cards, loans in self.service.group_stats()]
+
+    def handle(self, method, target, body):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path_matched = False
+        for route_method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method == method:
+                try:
+                    return handler(query, parse_body(body), *match.groups())
+                except ValidationError as e:
+                    return 400, {"error": str(e)}
+                except ConflictError as e:
+                    return 409, {"error": str(e)}
+                except KeyError:
+                    return 404, {"error": "Not found"}
+                except (ValueError, OverflowError) as e:
+                    return 400, {"error": f"Invalid request: {e}"}
+        if path_matched:
+            return 405, {"error": "Method not allowed"}
+        return 404, {"error": "Not found"}
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                try:
+                    status, payload = await loop.run_in_executor(self.executor, functools.partial(self.handle, method, target, body))
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != 'close'
+                writer.write(f"{version} {status} {REASONS[status]}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def sync_periodically(self):
+        # Other processes (a desk GUI, another server) may write to the same catalog files
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            await loop.run_in_executor(self.executor, self.service.sync)
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        sync = asyncio.create_task(self.sync_periodically())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sync.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the library catalog as HTTP/JSON on localhost")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--sqlite", metavar="DATABASE", help="use an SQLite catalog instead of books.txt and students.txt")
+    parser.add_argument("--columns", action="store_true", help="keep books.txt and students.txt in a column store: less memory, slower searches")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    service = LibraryService(SqliteBackend(args.sqlite) if args.sqlite else TextFileBackend(columns=args.columns))
+    service.load_all()
+    start_periodic_dump()
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(LibraryServer(service, args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from library_module import Book, StudentCard, Loan, parse_loans, parse_date
+from library_catalog import BOOK_SORT_KEYS, CARD_SORT_KEYS
+from loan_ledger import UnavailableError
+from instrumentation import instrumented
+
+CHANGE_HISTORY = 10000
+TOP_BORROWED = 10
+MAX_NUMBER = 2 ** 31 - 1  # What the column store's int arrays hold
+
+class ValidationError(ValueError):
+    pass
+
+
+class ReadWriteLock:
+    # Any number of readers, or a single writer; waiting writers hold off new readers so they are not starved
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+class LibraryService:
+    def __init__(self, storage):
+        self.storage = storage
+        self.lock = ReadWriteLock()
+        # Recent writes as (version, kind, id), so views can refresh only what changed
+        self.version = 0
+        self.changes = deque(maxlen=CHANGE_HISTORY)
+
+    @property
+    def loading(self):
+        return self.storage.loading
+
+    def load_next_chunk(self):
+        with self.lock.write():
+            return self.storage.load_next_chunk()
+
+    def load_all(self):
+        while self.load_next_chunk():
+            pass
+
+    def count_books(self):
+        with self.lock.read():
+            return len(self.storage.all_books())
+
+    def count_cards(self):
+        with self.lock.read():
+            return len(self.storage.all_cards())
+
+    def get_book(self, book_id):
+        with self.lock.read():
+            return self.storage.get_book(book_id)
+
+    def get_card(self, card_id):
+        with self.lock.read():
+            return self.storage.get_card(card_id)
+
+    def book_ids_by_title(self):
+        with self.lock.read():
+            return self.storage.book_ids_by_title()
+
+    def borrowed_books_info(self, card):
+        with self.lock.read():
+            return self.storage.borrowed_books_info(card)
+
+    @instrumented("service.search_books")
+    def search_books(self, field, term, cancelled=None, year_range=None, in_stock=False, sort_by=None, descending=False, fuzzy=False):
+        if sort_by and sort_by not in BOOK_SORT_KEYS:
+            raise ValidationError(f"Unknown sort column: {sort_by}")
+        with self.lock.read():
+            return self.storage.search_books(field, term.lower(), cancelled, year_range, in_stock, sort_by, descending, fuzzy)
+
+    @instrumented("service.search_cards")
+    def search_cards(self, field, term, cancelled=None, sort_by=None, descending=False, fuzzy=False):
+        if sort_by and sort_by not in CARD_SORT_KEYS:
+            raise ValidationError(f"Unknown sort column: {sort_by}")
+        today = datetime.today().date()
+        with self.lock.read():
+            if field == "overdue":
+                return self.storage.overdue_cards(today, sort_by, descending)
+            elif field == "due within days":
+                if not term.isdigit():
+                    return []
+                try:
+                    return self.storage.cards_due_within(int(term), today, sort_by, descending)
+                except OverflowError:
+                    raise ValidationError(f"Too many days: {term}")
+            return self.storage.search_cards(field, term.lower(), cancelled, sort_by, descending, fuzzy)
+
+    def record_change(self, kind, record_id):
+        self.version += 1
+        self.changes.append((self.version, kind, record_id))
+
+    def changes_since(self, version):
+        # Returns the current version and the ("book" | "card", id) pairs written after `version`,
+        # or None in place of the list when that far back is no longer known
+        with self.lock.read():
+            if version == self.version:
+                return self.version, []
+            if version is None or not self.changes or self.changes[0][0] > version + 1:
+                return self.version, None
+            return self.version, [(kind, record_id) for change_version, kind, record_id in self.changes if change_version > version]
+
+    def check_loaded(self):
+        if self.storage.loading:
+            raise ValidationError("The catalog is still loading, please try again in a moment")
+
+    def validate_text(self, *values):
+        # Records are stored as one " | "-separated line each, so a field must not break the line or the separator
+        for value in values:
+            if not isinstance(value, str):
+                raise ValidationError("Text fields must be strings")
+            if "\n" in value or "\r" in value or " | " in f" {value} ":
+                raise ValidationError(f"Text fields cannot contain line breaks or \" | \": {value!r}")
+
+    def validate_book(self, title, author, year, quantity):
+        if not title or not author or year in (None, "") or quantity in (None, ""):
+            raise ValidationError("All fields must be filled out")
+        self.validate_text(title, author)
+        try:
+            year, quantity = int(year), int(quantity)
+        except (TypeError, ValueError):
+            raise ValidationError("Year and Quantity must be integers")
+        if max(abs(year), abs(quantity)) > MAX_NUMBER:
+            raise ValidationError(f"Year and Quantity must be at most {MAX_NUMBER}")
+        return year, quantity
+
+    def validate_card(self, name, issue_date, group, borrowed_books):
+        if not name or not issue_date or not group:
+            raise ValidationError("All fields must be filled out")
+        self.validate_text(name, issue_date, group)
+        try:
+            return parse_loans(borrowed_books)
+        except (TypeError, ValueError, AttributeError):
+            raise ValidationError("Due dates must be in YYYY-MM-DD format")
+
+    def add_book(self, title, author, year, quantity):
+        year, quantity = self.validate_book(title, author, year, quantity)
+        with self.lock.write():
+            self.check_loaded()
+            book = Book(id=self.storage.next_book_id(), title=title, author=author, year=year, quantity=quantity)
+            self.storage.add_book(book)
+            self.record_change("book", book.id)
+            return book
+
+    def book_version(self, book_id):
+        with self.lock.read():
+            return self.storage.book_version(book_id)
+
+    def card_version(self, card_id):
+        with self.lock.read():
+            return self.storage.card_version(card_id)
+
+    def update_book(self, book_id, title, author, year, quantity, expected_version=None):
+        # A new object rather than an in-place edit, so a conflicting write leaves the stored one untouched
+        year, quantity = self.validate_book(title, author, year, quantity)
+        with self.lock.write():
+            self.check_loaded()
+            if self.storage.get_book(book_id) is None:
+                raise KeyError(book_id)
+            outstanding = self.storage.outstanding_loans(book_id)
+            if quantity < outstanding:
+                raise ValidationError(f"{outstanding} copies are on loan, the quantity cannot be lower")
+            book = Book(id=book_id, title=title, author=author, year=year, quantity=quantity)
+            self.storage.update_book(book, expected_version)
+            self.record_change("book", book.id)
+            return book
+
+    def delete_book(self, book_id, expected_version=None):
+        with self.lock.write():
+            self.check_loaded()
+            if self.storage.get_book(book_id) is None:
+                raise KeyError(book_id)
+            # The loans would keep counting copies of a book that no longer exists
+            outstanding = self.storage.outstanding_loans(book_id)
+            if outstanding:
+                raise ValidationError(f"{outstanding} copies are on loan, the book cannot be deleted")
+            self.storage.delete_book(book_id, expected_version)
+            self.record_change("book", book_id)
+
+    def add_card(self, name, issue_date, group, borrowed_books):
+        loans = self.validate_card(name, issue_date, group, borrowed_books)
+        with self.lock.write():
+            self.check_loaded()
+            card = StudentCard(id=self.storage.next_card_id(), title="Student Card", student_name=name, issue_date=issue_date, group=group)
+            card.set_loans(loans)
+            try:
+                self.storage.add_card(card)
+            except UnavailableError as e:
+                raise ValidationError(str(e)) from e
+            self.record_change("card", card.id)
+            return card
+
+    def update_card(self, card_id, name, issue_date, group, borrowed_books, expected_version=None):
+        loans = self.validate_card(name, issue_date, group, borrowed_books)
+        with self.lock.write():
+            self.check_loaded()
+            if self.storage.get_card(card_id) is None:
+                raise KeyError(card_id)
+            card = StudentCard(id=card_id, title="Student Card", student_name=name, issue_date=issue_date, group=group)
+            card.set_loans(loans)
+            try:
+                self.storage.update_card(card, expected_version)
+            except UnavailableError as e:
+                raise ValidationError(str(e)) from e
+            self.record_change("card", card.id)
+            return card
+
+    def delete_card(self, card_id, expected_version=None):
+        with self.lock.write():
+            self.check_loaded()
+            if self.storage.get_card(card_id) is None:
+                raise KeyError(card_id)
+            self.storage.delete_card(card_id, expected_version)
+            self.record_change("card", card_id)
+
+    def checkout(self, card_id, book_ids, due_date):
+        return self.lend_and_return(checkouts=[(card_id, book_id, due_date) for book_id in book_ids])
+
+    def return_books(self, card_id, book_ids):
+        return self.lend_and_return(returns=[(card_id, book_id) for book_id in book_ids])
+
+    def lend_and_return(self, checkouts=(), returns=()):
+        # One batch of (card ID, book ID, due date) checkouts and (card ID, book ID) returns, written all
+        # together or not at all; returns are applied first, so a copy returned can be lent in the same batch
+        try:
+            checkouts = [(card_id, book_id, parse_date(due_date)) for card_id, book_id, due_date in checkouts]
+        except (TypeError, ValueError):
+            raise ValidationError("Due dates must be in YYYY-MM-DD format")
+        with self.lock.write():
+            self.check_loaded()
+            cards = {}
+
+            def changed_card(card_id):
+                if card_id not in cards:
+                    card = self.storage.get_card(card_id)
+                    if card is None:
+                        raise KeyError(card_id)
+                    cards[card_id] = StudentCard(id=card.id, title="Student Card", student_name=card.student_name,
+                                                 issue_date=card.issue_date, group=card.group)
+                    cards[card_id].set_loans(list(card.loans))
+                return cards[card_id]
+
+            for card_id, book_id in returns:
+                loans = changed_card(card_id).loans
+                loan = next((loan for loan in loans if loan.book_id == book_id), None)
+                if loan is None:
+                    raise ValidationError(f"Card {card_id} has not borrowed book {book_id}")
+                loans.remove(loan)
+            for card_id, book_id, due_date in checkouts:
+                changed_card(card_id).loans.append(Loan(book_id, due_date))
+            try:
+                self.storage.update_cards(list(cards.values()))
+            except UnavailableError as e:
+                raise ValidationError(str(e)) from e
+            for card_id in cards:
+                self.record_change("card", card_id)
+            return list(cards.values())
+
+    def outstanding_loans(self, book_id):
+        with self.lock.read():
+            return self.storage.outstanding_loans(book_id)
+
+    def available_copies(self, book_id):
+        with self.lock.read():
+            book = self.storage.get_book(book_id)
+            if book is None:
+                raise KeyError(book_id)
+            return book.quantity - self.storage.outstanding_loans(book_id)
+
+    def top_borrowed(self, count=TOP_BORROWED):
+        with self.lock.read():
+            return self.storage.top_borrowed(count)
+
+    def group_stats(self):
+        with self.lock.read():
+            return self.storage.group_stats()
+
+    def sync(self):
+        # Picks up what other processes wrote to the same files; returns whether anything changed.
+        # The write lock waits for running searches, so it is only taken once a cheap check finds something
+        if not self.storage.changed_elsewhere():
+            return False
+        with self.lock.write():
+            changes = self.storage.sync()
+            if changes is None:
+                self.version += 1
+                self.changes.clear()  # Views that ask for changes since an older version refresh everything
+                return True
+            for kind, record_id in changes:
+                self.record_change(kind, record_id)
+            return bool(changes)
+
+    def close(self):
+        with self.lock.write():
+            self.storage.close()
@@ -0,0 +1,495 @@
+import argparse
+import json
+import sqlite3
+import threading
+from array import array
+from datetime import timedelta
+from library_module import Book, StudentCard, Loan, parse_date
+from library_file_handler import StorageBackend, ConflictError, iter_books_from_file, iter_student_cards_from_file
+from loan_ledger import loan_changes, check_available, split_available, split_by_outstanding
+from library_search import word_indexes, BOOK_FIELDS, CARD_FIELDS
+from transliteration import normalize
+from instrumentation import instrumented
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS books_title ON books (title);
+CREATE INDEX IF NOT EXISTS books_author ON books (author);
+CREATE INDEX IF NOT EXISTS books_year ON books (year);
+
+CREATE TABLE IF NOT EXISTS cards (
+    id INTEGER PRIMARY KEY,
+    student_name TEXT NOT NULL,
+    issue_date TEXT NOT NULL,
+    group_name TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cards_group ON cards (group_name);
+
+CREATE TABLE IF NOT EXISTS loans (
+    card_id INTEGER NOT NULL,
+    book_id INTEGER NOT NULL,
+    due_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS loans_card ON loans (card_id);
+CREATE INDEX IF NOT EXISTS loans_due_date ON loans (due_date);
+CREATE INDEX IF NOT EXISTS loans_book ON loans (book_id);
+
+-- Running totals of outstanding loans kept by triggers, so availability and statistics never scan the loans
+CREATE TABLE IF NOT EXISTS book_loans (
+    book_id INTEGER PRIMARY KEY,
+    outstanding INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS book_loans_outstanding ON book_loans (outstanding);
+CREATE TABLE IF NOT EXISTS group_loans (
+    group_name TEXT PRIMARY KEY,
+    cards INTEGER NOT NULL,
+    loans INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS loans_totals_insert AFTER INSERT ON loans BEGIN
+    INSERT INTO book_loans (book_id, outstanding) VALUES (new.book_id, 1) ON CONFLICT (book_id) DO UPDATE SET outstanding = outstanding + 1;
+    UPDATE group_loans SET loans = loans + 1 WHERE group_name = (SELECT group_name FROM cards WHERE id = new.card_id);
+END;
+CREATE TRIGGER IF NOT EXISTS loans_totals_delete AFTER DELETE ON loans BEGIN
+    UPDATE book_loans SET outstanding = outstanding - 1 WHERE book_id = old.book_id;
+    UPDATE group_loans SET loans = loans - 1 WHERE group_name = (SELECT group_name FROM cards WHERE id = old.card_id);
+END;
+CREATE TRIGGER IF NOT EXISTS cards_totals_insert AFTER INSERT ON cards BEGIN
+    INSERT INTO group_loans (group_name, cards, loans) VALUES (new.group_name, 1, 0) ON CONFLICT (group_name) DO UPDATE SET cards = cards + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cards_totals_delete AFTER DELETE ON cards BEGIN
+    UPDATE group_loans SET cards = cards - 1, loans = loans - (SELECT COUNT(*) FROM loans WHERE card_id = old.id) WHERE group_name = old.group_name;
+END;
+CREATE TRIGGER IF NOT EXISTS cards_totals_update AFTER UPDATE OF group_name ON cards WHEN old.group_name != new.group_name BEGIN
+    UPDATE group_loans SET cards = cards - 1, loans = loans - (SELECT COUNT(*) FROM loans WHERE card_id = old.id) WHERE group_name = old.group_name;
+    INSERT INTO group_loans (group_name, cards, loans) VALUES (new.group_name, 1, (SELECT COUNT(*) FROM loans WHERE card_id = new.id))
+        ON CONFLICT (group_name) DO UPDATE SET cards = cards + 1, loans = loans + excluded.loans;
+END;
+
+-- Search keys (transliteration.normalize, registered as search_key) under a trigram index, so substring
+-- matches agree with the text backend's; updates that leave the text alone do not reindex
+CREATE VIRTUAL TABLE IF NOT EXISTS books_search USING fts5 (title, author, tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS books_search_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_search (rowid, title, author) VALUES (new.id, search_key(new.title), search_key(new.author));
+END;
+CREATE TRIGGER IF NOT EXISTS books_search_delete AFTER DELETE ON books BEGIN
+    DELETE FROM books_search WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS books_search_update AFTER UPDATE OF title, author ON books BEGIN
+    UPDATE books_search SET title = search_key(new.title), author = search_key(new.author) WHERE rowid = new.id;
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_search USING fts5 (student_name, group_name, tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS cards_search_insert AFTER INSERT ON cards BEGIN
+    INSERT INTO cards_search (rowid, student_name, group_name) VALUES (new.id, search_key(new.student_name), search_key(new.group_name));
+END;
+CREATE TRIGGER IF NOT EXISTS cards_search_delete AFTER DELETE ON cards BEGIN
+    DELETE FROM cards_search WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS cards_search_update AFTER UPDATE OF student_name, group_name ON cards BEGIN
+    UPDATE cards_search SET student_name = search_key(new.student_name), group_name = search_key(new.group_name) WHERE rowid = new.id;
+END;
+"""
+
+BOOK_COLUMNS = {"title": "title", "author": "author"}
+CARD_COLUMNS = {"name": "student_name", "group": "group_name"}
+BOOK_SORT_COLUMNS = {"id": "id", "title": "lower_text(title)", "author": "lower_text(author)", "year": "year", "quantity": "quantity"}
+CARD_SORT_COLUMNS = {"id": "id", "name": "lower_text(student_name)", "issue date": "issue_date", "group": "lower_text(group_name)"}
+BATCH_SIZE = 1000
+
+
+class QueryResult:
+    # A list of matching IDs; rows are fetched from the database only for the positions that are read
+    def __init__(self, fetch, ids):
+        self.fetch = fetch
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return self.fetch(self.ids[position])
+        return self.fetch([self.ids[position]])[0]
+
+    def __iter__(self):
+        for start in range(0, len(self.ids), BATCH_SIZE):
+            yield from self.fetch(self.ids[start:start + BATCH_SIZE])
+
+
+class SqliteBackend(StorageBackend):
+    def __init__(self, filename="library.db"):
+        # One connection shared by the Tk thread and the search worker, serialized by the lock
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.create_function("lower_text", 1, lambda text: text.lower(), deterministic=True)
+        self.connection.create_function("search_key", 1, normalize, deterministic=True)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.executescript(SCHEMA)
+        self.data_version = self.query("PRAGMA data_version")[0][0]
+        # Typo-tolerant word indexes, built on the first fuzzy search
+        self.book_words = None
+        self.card_words = None
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def transaction(self, statements, check=None):
+        with self.lock, self.connection:
+            if check is not None:
+                # The write lock is taken before the check reads anything, so no other connection writes in between
+                self.connection.execute("BEGIN IMMEDIATE")
+                check()
+            self.execute_all(statements)
+
+    def execute_all(self, statements):
+        for sql, params in statements:
+            if isinstance(params, list):
+                self.connection.executemany(sql, params)
+            else:
+                self.connection.execute(sql, params)
+
+    def ids(self, sql, params=()):
+        return array('q', (row[0] for row in self.query(sql, params)))
+
+    def fetch_books(self, ids):
+        if not len(ids):
+            return []
+        rows = self.query(f"SELECT id, title, author, year, quantity FROM books WHERE id IN ({','.join('?' * len(ids))})", list(ids))
+        books = {row[0]: Book(*row) for row in rows}
+        return [books[book_id] for book_id in ids if book_id in books]
+
+    def fetch_cards(self, ids):
+        if not len(ids):
+            return []
+        placeholders = ','.join('?' * len(ids))
+        cards = {row[0]: StudentCard(row[0], "Student Card", row[1], row[2], row[3])
+                 for row in self.query(f"SELECT id, student_name, issue_date, group_name FROM cards WHERE id IN ({placeholders})", list(ids))}
+        loans = {card_id: [] for card_id in cards}
+        for card_id, book_id, due_date in self.query(f"SELECT card_id, book_id, due_date FROM loans WHERE card_id IN ({placeholders}) ORDER BY rowid", list(ids)):
+            loans[card_id].append(Loan(book_id, parse_date(due_date)))
+        for card_id, card in cards.items():
+            card.set_loans(loans[card_id])
+        return [cards[card_id] for card_id in ids if card_id in cards]
+
+    def all_books(self):
+        return QueryResult(self.fetch_books, self.ids("SELECT id FROM books ORDER BY id"))
+
+    def all_cards(self):
+        return QueryResult(self.fetch_cards, self.ids("SELECT id FROM cards ORDER BY id"))
+
+    def get_book(self, book_id):
+        books = self.fetch_books([book_id])
+        return books[0] if books else None
+
+    def get_card(self, card_id):
+        cards = self.fetch_cards([card_id])
+        return cards[0] if cards else None
+
+    def next_book_id(self):
+        return self.query("SELECT COALESCE(MAX(id), 0) + 1 FROM books")[0][0]
+
+    def next_card_id(self):
+        return self.query("SELECT COALESCE(MAX(id), 0) + 1 FROM cards")[0][0]
+
+    def book_ids_by_title(self):
+        return dict(self.query("SELECT title, id FROM books ORDER BY id"))
+
+    def text_search_condition(self, table, column, term):
+        term = normalize(term)
+        if not term:
+            return "1", ()
+        if len(term) >= 3:
+            # The trigram tokenizer answers substring matches from the FTS index
+            phrase = term.replace('"', '""')
+            return f"id IN (SELECT rowid FROM {table}_search WHERE {table}_search MATCH ?)", (f'{column} : "{phrase}"',)
+        # Shorter than a trigram: scan the stored search keys
+        return f"id IN (SELECT rowid FROM {table}_search WHERE instr({column}, ?) > 0)", (term,)
+
+    def order_by(self, sort_columns, sort_by, descending):
+        if not sort_by:
+            return "id"
+        return f"{sort_columns[sort_by]} {'DESC' if descending else 'ASC'}, id"
+
+    @instrumented("storage.search_books")
+    def search_books(self, field, term, cancelled=None, year_range=None, in_stock=False, sort_by=None, descending=False, fuzzy=False):
+        # All conditions and the sort go into one query, so only the matching IDs come back
+        ranked = None
+        if field in BOOK_COLUMNS and fuzzy and term:
+            ranked = self.fuzzy_ranked("books", BOOK_COLUMNS[field], self.book_word_index()[field], term)
+            condition, params = "id IN (SELECT value FROM json_each(?))", (json.dumps(ranked),)
+        elif field in BOOK_COLUMNS:
+            condition, params = self.text_search_condition("books", BOOK_COLUMNS[field], term)
+        elif field == "year":
+            if not term.isdigit():
+                return []
+            condition, params = "year = ?", (int(term),)
+        else:
+            raise ValueError(f"Unknown book search field: {field}")
+        conditions = [condition]
+        params = list(params)
+        first_year, last_year = year_range or (None, None)
+        if first_year is not None:
+            conditions.append("year >= ?")
+            params.append(first_year)
+        if last_year is not None:
+            conditions.append("year <= ?")
+            params.append(last_year)
+        if in_stock:
+            conditions.append("quantity > COALESCE((SELECT outstanding FROM book_loans WHERE book_loans.book_id = books.id), 0)")
+        ids = self.ids(f"SELECT id FROM books WHERE {' AND '.join(conditions)} ORDER BY {self.order_by(BOOK_SORT_COLUMNS, sort_by, descending)}", params)
+        return QueryResult(self.fetch_books, self.in_rank_order(ranked, ids) if ranked is not None and not sort_by else ids)
+
+    @instrumented("storage.search_cards")
+    def search_cards(self, field, term, cancelled=None, sort_by=None, descending=False, fuzzy=False):
+        ranked = None
+        if field in CARD_COLUMNS and fuzzy and term:
+            ranked = self.fuzzy_ranked("cards", CARD_COLUMNS[field], self.card_word_index()[field], term)
+            condition, params = "id IN (SELECT value FROM json_each(?))", (json.dumps(ranked),)
+        elif field in CARD_COLUMNS:
+            condition, params = self.text_search_condition("cards", CARD_COLUMNS[field], term)
+        elif field == "id":
+            if not term.isdigit():
+                return []
+            condition, params = "id = ?", (int(term),)
+        else:
+            raise ValueError(f"Unknown card search field: {field}")
+        return self.card_query(condition, params, sort_by, descending, ranked)
+
+    def card_query(self, condition, params, sort_by, descending, ranked=None):
+        ids = self.ids(f"SELECT id FROM cards WHERE {condition} ORDER BY {self.order_by(CARD_SORT_COLUMNS, sort_by, descending)}", params)
+        return QueryResult(self.fetch_cards, self.in_rank_order(ranked, ids) if ranked is not None and not sort_by else ids)
+
+    def fuzzy_ranked(self, table, column, words, term):
+        # Ranked like the text backend: substring matches from the FTS index in ID order, then typo matches, closest first
+        condition, params = self.text_search_condition(table, column, term)
+        substring_ids = self.ids(f"SELECT id FROM {table} WHERE {condition} ORDER BY id", params)
+        return list(substring_ids) + words.search(term, skip_substrings=True)
+
+    def in_rank_order(self, ranked, ids):
+        kept = set(ids)
+        return array('q', (record_id for record_id in ranked if record_id in kept))
+
+    def book_word_index(self):
+        # Built from one pass over the table on the first fuzzy search, then kept current by this
+        # connection's writes; sync() drops it when another connection commits
+        if self.book_words is None:
+            self.book_words = word_indexes(BOOK_FIELDS, (Book(*row) for row in self.query("SELECT id, title, author, year, quantity FROM books")))
+        return self.book_words
+
+    def card_word_index(self):
+        if self.card_words is None:
+            self.card_words = word_indexes(CARD_FIELDS, (StudentCard(row[0], "Student Card", row[1], row[2], row[3])
+                                                         for row in self.query("SELECT id, student_name, issue_date, group_name FROM cards")))
+        return self.card_words
+
+    def index_words(self, indexes, records=(), removed_ids=()):
+        if indexes is None:
+            return
+        for index in indexes.values():
+            for record_id in removed_ids:
+                index.remove(record_id)
+            for record in records:
+                index.update(record)
+
+    @instrumented("storage.overdue_cards")
+    def overdue_cards(self, as_of, sort_by=None, descending=False):
+        if sort_by:
+            return self.card_query("id IN (SELECT card_id FROM loans WHERE due_date < ?)", (as_of.isoformat(),), sort_by, descending)
+        return QueryResult(self.fetch_cards, self.ids(
+            "SELECT card_id FROM loans WHERE due_date < ? GROUP BY card_id ORDER BY MIN(due_date), card_id", (as_of.isoformat(),)))
+
+    @instrumented("storage.cards_due_within")
+    def cards_due_within(self, days, today, sort_by=None, descending=False):
+        params = (today.isoformat(), (today + timedelta(days=days)).isoformat())
+        if sort_by:
+            return self.card_query("id IN (SELECT card_id FROM loans WHERE due_date >= ? AND due_date <= ?)", params, sort_by, descending)
+        return QueryResult(self.fetch_cards, self.ids(
+            "SELECT card_id FROM loans WHERE due_date >= ? AND due_date <= ? GROUP BY card_id ORDER BY MIN(due_date), card_id", params))
+
+    def borrowed_books_info(self, card):
+        book_ids = list({loan.book_id for loan in card.loans})
+        titles = dict(self.query(f"SELECT id, title FROM books WHERE id IN ({','.join('?' * len(book_ids))})", book_ids)) if book_ids else {}
+        return [(titles.get(loan.book_id, "Unknown"), loan.due_date) for loan in card.loans]
+
+    def book_row(self, book):
+        return (book.id, book.title, book.author, book.year, book.quantity)
+
+    def card_row(self, card):
+        return (card.id, card.student_name, card.issue_date, card.group)
+
+    def loan_rows(self, card):
+        return [(card.id, loan.book_id, loan.due_date.isoformat()) for loan in card.loans]
+
+    def add_book(self, book):
+        self.add_books([book])
+
+    def add_books(self, books):
+        self.transaction([("INSERT INTO books (id, title, author, year, quantity) VALUES (?, ?, ?, ?, ?)", [self.book_row(book) for book in books])])
+        self.index_words(self.book_words, books)
+
+    def update_book(self, book, expected_version=None):
+        self.transaction([("UPDATE books SET title = ?, author = ?, year = ?, quantity = ?, version = version + 1 WHERE id = ?",
+                           (book.title, book.author, book.year, book.quantity, book.id))],
+                         lambda: self.check_version("books", book.id, expected_version))
+        self.index_words(self.book_words, [book])
+
+    def delete_book(self, book_id, expected_version=None):
+        self.transaction([("DELETE FROM books WHERE id = ?", (book_id,))], lambda: self.check_version("books", book_id, expected_version))
+        self.index_words(self.book_words, removed_ids=[book_id])
+
+    def book_version(self, book_id):
+        rows = self.query("SELECT version FROM books WHERE id = ?", (book_id,))
+        return rows[0][0] if rows else None
+
+    def card_version(self, card_id):
+        rows = self.query("SELECT version FROM cards WHERE id = ?", (card_id,))
+        return rows[0][0] if rows else None
+
+    def check_version(self, table, record_id, expected_version):
+        # Every update bumps the row's version, so a stale edit form is refused instead of overwriting
+        if expected_version is None:
+            return
+        row = self.connection.execute(f"SELECT version FROM {table} WHERE id = ?", (record_id,)).fetchone()
+        if row is not None and row[0] != expected_version:
+            raise ConflictError(f"Record {record_id} was changed by someone else")
+
+    def add_card(self, card):
+        self.transaction(self.insert_card_statements([card]), lambda: self.check_loans([card]))
+        self.index_words(self.card_words, [card])
+
+    def add_cards(self, cards):
+        self.transaction(self.insert_card_statements(cards))
+        self.index_words(self.card_words, cards)
+
+    def insert_card_statements(self, cards):
+        return [
+            ("INSERT INTO cards (id, student_name, issue_date, group_name) VALUES (?, ?, ?, ?)", [self.card_row(card) for card in cards]),
+            ("INSERT INTO loans (card_id, book_id, due_date) VALUES (?, ?, ?)", [row for card in cards for row in self.loan_rows(card)]),
+        ]
+
+    def update_card(self, card, expected_version=None):
+        self.update_cards([card], {card.id: expected_version})
+
+    def update_cards(self, cards, expected_versions=None):
+        def check():
+            for card in cards:
+                self.check_version("cards", card.id, (expected_versions or {}).get(card.id))
+            self.check_loans(cards)
+
+        self.transaction([
+            ("UPDATE cards SET student_name = ?, issue_date = ?, group_name = ?, version = version + 1 WHERE id = ?",
+             [(card.student_name, card.issue_date, card.group, card.id) for card in cards]),
+            ("DELETE FROM loans WHERE card_id = ?", [(card.id,) for card in cards]),
+            ("INSERT INTO loans (card_id, book_id, due_date) VALUES (?, ?, ?)", [row for card in cards for row in self.loan_rows(card)]),
+        ], check)
+        self.index_words(self.card_words, cards)
+
+    def check_loans(self, cards):
+        check_available(loan_changes(cards, self.held_before), self.book_stock)
+
+    # These run inside the write transaction, on the connection directly since the lock is already held
+    def held_before(self, card_id):
+        return [row[0] for row in self.connection.execute("SELECT book_id FROM loans WHERE card_id = ?", (card_id,))]
+
+    def book_stock(self, book_id):
+        return self.connection.execute("SELECT title, quantity, COALESCE(outstanding, 0) FROM books "
+                                       "LEFT JOIN book_loans ON book_loans.book_id = books.id WHERE books.id = ?", (book_id,)).fetchone()
+
+    def outstanding_in_transaction(self, book_id):
+        row = self.connection.execute("SELECT outstanding FROM book_loans WHERE book_id = ?", (book_id,)).fetchone()
+        return row[0] if row else 0
+
+    def outstanding_loans(self, book_id):
+        rows = self.query("SELECT outstanding FROM book_loans WHERE book_id = ?", (book_id,))
+        return rows[0][0] if rows else 0
+
+    def top_borrowed(self, count):
+        rows = self.query("SELECT book_id, outstanding FROM book_loans WHERE outstanding > 0 ORDER BY outstanding DESC, book_id LIMIT ?", (count,))
+        books = {book.id: book for book in self.fetch_books([book_id for book_id, _ in rows])}
+        return [(books.get(book_id), outstanding) for book_id, outstanding in rows]
+
+    def group_stats(self):
+        return self.query("SELECT group_name, cards, loans FROM group_loans WHERE cards > 0 ORDER BY group_name")
+
+    def delete_card(self, card_id, expected_version=None):
+        self.transaction([
+            ("DELETE FROM loans WHERE card_id = ?", (card_id,)),
+            ("DELETE FROM cards WHERE id = ?", (card_id,)),
+        ], lambda: self.check_version("cards", card_id, expected_version))
+        self.index_words(self.card_words, removed_ids=[card_id])
+
+    def import_books(self, books):
+        # Like transaction(), but the loan check decides which records are written
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            books, rejected = split_by_outstanding(books, self.outstanding_in_transaction)
+            self.execute_all([("INSERT INTO books (id, title, author, year, quantity) VALUES (?, ?, ?, ?, ?) "
+                               "ON CONFLICT (id) DO UPDATE SET title = excluded.title, author = excluded.author, "
+                               "year = excluded.year, quantity = excluded.quantity, version = version + 1", [self.book_row(book) for book in books])])
+        self.index_words(self.book_words, books)
+        return rejected
+
+    def import_cards(self, cards):
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            cards, rejected = split_available(cards, self.held_before, self.book_stock)
+            # An upsert rather than INSERT OR REPLACE, so the search key update trigger fires
+            self.execute_all([
+                ("INSERT INTO cards (id, student_name, issue_date, group_name) VALUES (?, ?, ?, ?) "
+                 "ON CONFLICT (id) DO UPDATE SET student_name = excluded.student_name, issue_date = excluded.issue_date, "
+                 "group_name = excluded.group_name, version = version + 1", [self.card_row(card) for card in cards]),
+                ("DELETE FROM loans WHERE card_id = ?", [(card.id,) for card in cards]),
+                ("INSERT INTO loans (card_id, book_id, due_date) VALUES (?, ?, ?)", [row for card in cards for row in self.loan_rows(card)]),
+            ])
+        self.index_words(self.card_words, cards)
+        return rejected
+
+    def import_text_files(self, books_filename, cards_filename):
+        for books in iter_books_from_file(books_filename, BATCH_SIZE):
+            self.add_books(books)
+        for cards in iter_student_cards_from_file(cards_filename, BATCH_SIZE):
+            self.add_cards(cards)
+
+    def changed_elsewhere(self):
+        return self.query("PRAGMA data_version")[0][0] != self.data_version
+
+    def sync(self):
+        # SQLite already isolates concurrent writers; data_version only says that another connection
+        # committed, not what, so any change refreshes everything
+        data_version = self.query("PRAGMA data_version")[0][0]
+        if data_version == self.data_version:
+            return []
+        self.data_version = data_version
+        self.book_words = None
+        self.card_words = None
+        return None
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import books.txt and students.txt into an SQLite catalog")
+    parser.add_argument("books_file")
+    parser.add_argument("cards_file")
+    parser.add_argument("database")
+    args = parser.parse_args()
+
+    backend = SqliteBackend(args.database)
+    backend.import_text_files(args.books_file, args.cards_file)
+    backend.close()
+
+if __name__ == "__main__":
+    main()
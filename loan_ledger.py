@@ -0,0 +1,130 @@
+import heapq
+from collections import Counter
+
+class UnavailableError(ValueError):
+    pass
+
+
+def loan_changes(cards, held_before):
+    # Copies each book would gain (positive) or get back (negative) if `cards` replaced the stored ones;
+    # held_before(card_id) gives the book IDs a card holds now
+    changes = Counter()
+    for card in cards:
+        changes.update(loan.book_id for loan in card.loans)
+        changes.subtract(held_before(card.id))
+    return changes
+
+def check_available(changes, book_stock):
+    # book_stock(book_id) gives (title, quantity, copies out), or None for a book that does not exist
+    for book_id, change in changes.items():
+        if change <= 0:
+            continue  # Returns and untouched loans are always allowed, even where the data was already over quantity
+        stock = book_stock(book_id)
+        if stock is None:
+            raise UnavailableError(f"Book {book_id} does not exist")
+        title, quantity, outstanding = stock
+        if outstanding + change > quantity:
+            raise UnavailableError(f"Not enough copies of \"{title}\": {quantity - outstanding} available, {change} requested")
+
+def split_available(cards, held_before, book_stock):
+    # For bulk imports: the cards whose loans fit in stock, taken in order, and (card, reason) for the rest
+    accepted = []
+    rejected = []
+    taken = Counter()
+
+    def stock_after_accepted(book_id):
+        stock = book_stock(book_id)
+        return None if stock is None else (stock[0], stock[1], stock[2] + taken[book_id])
+
+    for card in cards:
+        changes = loan_changes([card], held_before)
+        try:
+            check_available(changes, stock_after_accepted)
+        except UnavailableError as e:
+            rejected.append((card, str(e)))
+            continue
+        accepted.append(card)
+        taken.update(changes)
+    return accepted, rejected
+
+def split_by_outstanding(books, outstanding):
+    # The books with at least as many copies as are on loan, and (book, reason) for the rest
+    accepted = []
+    rejected = []
+    for book in books:
+        on_loan = outstanding(book.id)
+        if book.quantity < on_loan:
+            rejected.append((book, f"{on_loan} copies are on loan, the quantity cannot be lower"))
+        else:
+            accepted.append(book)
+    return accepted, rejected
+
+
+class LoanLedger:
+    # Outstanding loans kept as running totals, per book, per card and per student group,
+    # so availability and statistics are answered without scanning the cards
+    def __init__(self, cards=None):
+        self.book_loans = Counter()
+        self.card_loans = {}
+        self.card_groups = {}
+        self.group_cards = Counter()
+        self.group_loans = Counter()
+        for card in cards or []:
+            self.add(card)
+
+    def add(self, card):
+        held = Counter(loan.book_id for loan in card.loans)
+        self.card_loans[card.id] = held
+        self.card_groups[card.id] = card.group
+        self.book_loans.update(held)
+        self.group_cards[card.group] += 1
+        self.group_loans[card.group] += sum(held.values())
+
+    def add_many(self, cards):
+        for card in cards:
+            self.add(card)
+
+    def remove(self, card_id):
+        held = self.card_loans.pop(card_id, None)
+        if held is None:
+            return
+        group = self.card_groups.pop(card_id)
+        book_loans = self.book_loans
+        for book_id, copies in held.items():
+            book_loans[book_id] -= copies
+            if not book_loans[book_id]:
+                del book_loans[book_id]
+        self.group_cards[group] -= 1
+        self.group_loans[group] -= sum(held.values())
+        if not self.group_cards[group]:
+            del self.group_cards[group]
+            del self.group_loans[group]
+
+    def update(self, card):
+        self.remove(card.id)
+        self.add(card)
+
+    def outstanding(self, book_id):
+        return self.book_loans.get(book_id, 0)
+
+    def held_by(self, card_id):
+        return self.card_loans.get(card_id, Counter()).elements()
+
+    def book_stock(self, books):
+        def book_stock(book_id):
+            book = books.get(book_id)
+            return None if book is None else (book.title, book.quantity, self.outstanding(book_id))
+        return book_stock
+
+    def check(self, cards, books):
+        check_available(loan_changes(cards, self.held_by), self.book_stock(books))
+
+    def split(self, cards, books):
+        return split_available(cards, self.held_by, self.book_stock(books))
+
+    def top_borrowed(self, count):
+        # Only books with copies out are visited, most first and lowest ID first among equals
+        return heapq.nsmallest(count, self.book_loans.items(), key=lambda item: (-item[1], item[0]))
+
+    def group_stats(self):
+        return [(group, self.group_cards[group], self.group_loans[group]) for group in sorted(self.group_cards)]
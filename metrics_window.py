@@ -0,0 +1,56 @@
+import tkinter as tk
+from instrumentation import metrics, DUMP_FILENAME
+
+class MetricsWindow(tk.Toplevel):
+    REFRESH_MS = 1000
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Library Metrics")
+
+        self.refresh_job = None
+        self.text = tk.Text(self, width=110, height=30, font=("Courier", 10))
+        self.text.pack(fill=tk.BOTH, expand=True)
+        buttons = tk.Frame(self)
+        buttons.pack(fill=tk.X)
+        tk.Button(buttons, text="Reset", command=self.reset).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(buttons, text="Dump JSON", command=self.dump).pack(side=tk.LEFT, padx=5, pady=5)
+        self.status = tk.Label(buttons, anchor="w")
+        self.status.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        self.refresh()
+
+    def refresh(self):
+        snapshot = metrics.snapshot()
+        lines = [f"{'operation':<36}{'count':>9}{'total ms':>12}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        # Slowest operations in total first, since that is where a stall is usually spent
+        for name, stats in sorted(snapshot["histograms"].items(), key=lambda item: -item[1]["total"]):
+            lines.append(f"{name:<36}{stats['count']:>9}{stats['total'] * 1000:>12.1f}{stats['mean'] * 1000:>10.2f}"
+                         f"{stats['p50'] * 1000:>10.2f}{stats['p99'] * 1000:>10.2f}{stats['max'] * 1000:>10.2f}")
+        if snapshot["counters"]:
+            lines.append("")
+            lines += [f"{name:<36}{value:>9}" for name, value in sorted(snapshot["counters"].items())]
+
+        position = self.text.yview()[0]
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, "\n".join(lines))
+        self.text.yview_moveto(position)
+        self.refresh_job = self.after(self.REFRESH_MS, self.refresh)
+
+    def destroy(self):
+        # Otherwise the pending refresh fires after the window is gone and Tk reports "invalid command name"
+        if self.refresh_job is not None:
+            self.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        super().destroy()
+
+    def reset(self):
+        metrics.reset()
+
+    def dump(self):
+        filename = DUMP_FILENAME or "library-metrics.json"
+        try:
+            metrics.dump(filename)
+            self.status.config(text=f"Written to {filename}")
+        except OSError as e:
+            self.status.config(text=f"Could not write {filename}: {e}")
@@ -0,0 +1,42 @@
+from collections import defaultdict
+
+def card_row(card, borrowed_books_info):
+    # The student list's row text, built without Tk so benchmarks can time it headless
+    borrowed_books_text = ", ".join([f"{book_name} (Due: {due_date})" for book_name, due_date in borrowed_books_info])
+    return f"ID: {card.id} | Name: {card.student_name} | Issue Date: {card.issue_date} | Group: {card.group} | Borrowed Books: {borrowed_books_text}"
+
+def card_references(card):
+    return [loan.book_id for loan in card.loans]
+
+
+class RenderCache:
+    # Display strings by record ID, plus which records reference each other ID (a card's borrowed books),
+    # so editing a book only re-renders the rows that show its title
+    def __init__(self, render, references):
+        self.render = render
+        self.references = references
+        self.rows = {}
+        self.dependents = defaultdict(set)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, record):
+        row = self.rows.get(record.id)
+        if row is None:
+            row = self.render(record)
+            self.rows[record.id] = row
+            for referenced_id in self.references(record):
+                self.dependents[referenced_id].add(record.id)
+        return row
+
+    def invalidate(self, record_id):
+        self.rows.pop(record_id, None)
+
+    def invalidate_references(self, referenced_id):
+        for record_id in self.dependents.pop(referenced_id, ()):
+            self.rows.pop(record_id, None)
+
+    def clear(self):
+        self.rows.clear()
+        self.dependents.clear()
@@ -0,0 +1,36 @@
+import tkinter as tk
+
+class StatisticsWindow(tk.Toplevel):
+    REFRESH_MS = 5000
+
+    def __init__(self, master, service):
+        super().__init__(master)
+        self.title("Loan Statistics")
+        self.service = service
+
+        self.refresh_job = None
+        self.text = tk.Text(self, width=80, height=30, font=("Courier", 10))
+        self.text.pack(fill=tk.BOTH, expand=True)
+
+        self.refresh()
+
+    def refresh(self):
+        # Both come from running totals, so refreshing costs the same on any catalog size
+        lines = [f"{'Most borrowed':<60}{'on loan':>9}"]
+        for book, outstanding in self.service.top_borrowed():
+            title = f"{book.title} ({book.author})" if book is not None else "Unknown"
+            lines.append(f"{title[:59]:<60}{outstanding:>9}")
+        lines += ["", f"{'Group':<40}{'students':>10}{'on loan':>10}"]
+        for group, cards, loans in self.service.group_stats():
+            lines.append(f"{group[:39]:<40}{cards:>10}{loans:>10}")
+
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, "\n".join(lines))
+        self.refresh_job = self.after(self.REFRESH_MS, self.refresh)
+
+    def destroy(self):
+        # Closing the window destroys the refresh command too, so a refresh still scheduled would raise a bgerror
+        if self.refresh_job is not None:
+            self.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        super().destroy()
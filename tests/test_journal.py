@@ -0,0 +1,179 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import library_file_handler
+from library_file_handler import JournaledFile, TextFileBackend, ConflictError
+from library_module import Book
+
+
+def book(book_id, title="Title"):
+    return Book(id=book_id, title=title, author="Author", year=2000, quantity=1)
+
+
+def strings(records):
+    return sorted(record.to_string() for record in records)
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.books_filename = os.path.join(self.directory, "books.txt")
+        self.cards_filename = os.path.join(self.directory, "students.txt")
+        open(self.books_filename, 'w').close()
+        open(self.cards_filename, 'w').close()
+        self.journals = []
+
+    def tearDown(self):
+        for journal in self.journals:
+            journal.close()
+        shutil.rmtree(self.directory)
+
+    def journal(self):
+        journal = JournaledFile(self.books_filename, Book.from_string)
+        self.journals.append(journal)
+        return journal
+
+    def backend(self):
+        backend = TextFileBackend(self.books_filename, self.cards_filename).load_all()
+        self.journals += [backend.books_journal, backend.cards_journal]
+        return backend
+
+    def write(self, journal, records):
+        with journal.lock:
+            for record in records:
+                journal.log_put(record)
+
+
+class CompactionCrashTest(JournalTestCase):
+    def test_crash_before_the_snapshot_is_written(self):
+        journal = self.journal()
+        journal.load()
+        self.write(journal, [book(1), book(2)])
+        versions = journal.version_of(1), journal.version_of(2)
+
+        def fail_on_base_file(filename, lines):
+            if filename == self.books_filename:
+                raise OSError("disk full")
+            write_lines(filename, lines)
+
+        write_lines = library_file_handler.atomic_write_lines
+        with mock.patch.object(library_file_handler, 'atomic_write_lines', fail_on_base_file), \
+                mock.patch.object(threading, 'excepthook', lambda args: None):
+            journal.compact([book(1), book(2)], wait=True)
+        self.assertTrue(os.path.exists(journal.compacting_filename))
+        self.write(journal, [book(3)])
+
+        recovered = self.journal()
+        self.assertEqual(strings(recovered.load()), strings([book(1), book(2), book(3)]))
+        self.assertFalse(os.path.exists(recovered.compacting_filename))
+        self.assertEqual((recovered.version_of(1), recovered.version_of(2)), versions)
+        self.assertEqual(recovered.version_of(3), journal.version_of(3))
+
+    def test_crash_after_the_snapshot_is_written(self):
+        journal = self.journal()
+        journal.load()
+        self.write(journal, [book(1), book(2, "Old")])
+        journal.compact([book(1), book(2, "Old")], wait=True)
+        self.write(journal, [book(2, "New")])
+        # As if the process died between writing the snapshot and removing the compacting log
+        with open(journal.compacting_filename, 'w', encoding='utf-8') as file:
+            file.write(f"put 1 | {book(1).to_string()}\nput 2 | {book(2, 'Old').to_string()}\n")
+
+        self.assertEqual(strings(self.journal().load()), strings([book(1), book(2, "New")]))
+
+    def test_versions_are_carried_across_compaction(self):
+        journal = self.journal()
+        journal.load()
+        self.write(journal, [book(1), book(2), book(1, "Again")])
+        journal.compact([book(1, "Again"), book(2)], wait=True)
+
+        reloaded = self.journal()
+        reloaded.load()
+        self.assertEqual(reloaded.version_of(1), journal.version_of(1))
+        self.assertEqual(reloaded.version_of(2), journal.version_of(2))
+        self.assertEqual(reloaded.lsn, journal.lsn)
+
+
+class TornWriteTest(JournalTestCase):
+    def test_torn_tail_is_dropped_and_not_appended_onto(self):
+        journal = self.journal()
+        journal.load()
+        self.write(journal, [book(1), book(2)])
+        with open(journal.log_filename, 'a', encoding='utf-8') as file:
+            file.write(f"put 3 | {book(3).to_string()[:6]}")
+
+        reloaded = self.journal()
+        self.assertEqual(strings(reloaded.load()), strings([book(1), book(2)]))
+        self.write(reloaded, [book(4)])
+        self.assertEqual(strings(self.journal().load()), strings([book(1), book(2), book(4)]))
+
+    def test_poll_leaves_a_partial_entry_for_later(self):
+        journal, follower = self.journal(), self.journal()
+        journal.load()
+        follower.load()
+        entry = f"put 1 | {book(1).to_string()}\n".encode('utf-8')
+        with open(journal.log_filename, 'ab') as file:
+            file.write(entry[:5])
+            file.flush()
+            self.assertEqual(follower.poll(), [])
+            file.write(entry[5:])
+        self.assertEqual([(record_id, record.to_string()) for record_id, record in follower.poll()],
+                         [(1, book(1).to_string())])
+
+
+class TwoHandlesTest(JournalTestCase):
+    def test_stale_version_is_a_conflict(self):
+        one, two = self.backend(), self.backend()
+        one.add_book(book(1))
+        two.sync()
+        version = two.book_version(1)
+        one.update_book(book(1, "Changed here"), one.book_version(1))
+        with self.assertRaises(ConflictError):
+            two.update_book(book(1, "Changed there"), version)
+        with self.assertRaises(ConflictError):
+            two.delete_book(1, version)
+        two.update_book(book(1, "Changed there"), two.book_version(1))
+        one.sync()
+        self.assertEqual(one.get_book(1).title, "Changed there")
+
+    def test_concurrent_adds_get_distinct_ids(self):
+        one, two = self.backend(), self.backend()
+        one.add_book(book(one.next_book_id()))
+        two.add_book(book(two.next_book_id(), "Other"))
+        one.sync()
+        self.assertEqual(strings(one.all_books()), strings(two.all_books()))
+        self.assertEqual(len(one.all_books()), 2)
+
+    def test_follower_reads_through_a_compaction(self):
+        one, two = self.backend(), self.backend()
+        one.books_journal.compact_threshold = 200
+        for book_id in range(1, 11):
+            one.add_book(book(book_id))
+            self.assertIsNotNone(two.sync())
+        self.assertEqual(strings(two.all_books()), strings(one.all_books()))
+        self.assertEqual(two.book_version(5), one.book_version(5))
+
+    def test_import_is_read_from_the_log(self):
+        one, two = self.backend(), self.backend()
+        one.import_books([book(book_id) for book_id in range(1, 51)])
+        self.assertEqual(len(two.sync()), 50)
+        self.assertEqual(two.book_version(50), one.book_version(50))
+
+    def test_missed_compaction_reloads(self):
+        one, two = self.backend(), self.backend()
+        one.books_journal.compact_threshold = 100
+        for book_id in range(1, 11):
+            one.add_book(book(book_id))
+        self.assertIsNone(two.sync())
+        self.assertEqual(strings(two.all_books()), strings(one.all_books()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import re
+import unicodedata
+
+# Ukrainian national romanization (2010) without its word-initial forms, plus the letters only Russian has
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie", "ж": "zh", "з": "z",
+    "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ь": "", "ю": "iu", "я": "ia", "ё": "e", "ы": "y", "э": "e", "ъ": "",
+}
+# Applied to text that has been casefolded and decomposed: accents are dropped, Cyrillic is spelled in Latin,
+# y/j, which transliterations use interchangeably with i, are folded into it, and h into g, since "г" is g
+# in Russian romanizations and h in Ukrainian ones ("Bulgakov" and "Bulhakov", "Gogol" and "Hohol")
+FOLD = str.maketrans({
+    **{chr(mark): None for mark in range(0x300, 0x370)},
+    **{letter: latin.replace("y", "i").replace("h", "g") for letter, latin in CYRILLIC_TO_LATIN.items()},
+    "ł": "l", "ø": "o", "đ": "d", "æ": "ae", "œ": "oe",  # Latin letters with no decomposition
+    "'": None, "’": None, "ʼ": None, "`": None, "y": "i", "j": "i", "h": "g",
+})
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    # The search key for a title, name or query: "Війна і мир", "VIYNA I MYR" and "Vijna i mir" all give "viina i mir"
+    text = text.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+    return " ".join(NON_WORD.sub(" ", text.translate(FOLD)).split())
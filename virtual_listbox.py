@@ -0,0 +1,87 @@
+import tkinter as tk
+from instrumentation import instrumented
+
+class VirtualListbox(tk.Frame):
+    def __init__(self, master, format_row, width=100, height=20):
+        super().__init__(master)
+        self.format_row = format_row
+        self.page_size = height
+        self.records = []
+        self.offset = 0
+        self.selected = None
+
+        self.listbox = tk.Listbox(self, width=width, height=height, exportselection=False)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind("<<ListboxSelect>>", self.on_select)
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll_by(-1 if event.delta > 0 else 1))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll_by(-1))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll_by(1))
+        self.listbox.bind("<Up>", lambda event: self.move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self.move_selection(1))
+        self.listbox.bind("<Prior>", lambda event: self.scroll_by(-self.page_size))
+        self.listbox.bind("<Next>", lambda event: self.scroll_by(self.page_size))
+
+    def bind(self, sequence=None, func=None, add=None):
+        return self.listbox.bind(sequence, func, add)
+
+    def set_records(self, records, keep_position=False):
+        self.records = records
+        if not keep_position:
+            self.offset = 0
+            self.selected = None
+        elif self.selected is not None and self.selected >= len(records):
+            self.selected = None
+        self.offset = max(0, min(self.offset, len(records) - self.page_size))
+        self.render()
+
+    @instrumented("listbox.render")
+    def render(self):
+        # Only the visible page is formatted and sent to Tk, in a single insert call
+        rows = [self.format_row(record) for record in self.records[self.offset:self.offset + self.page_size]]
+        self.listbox.delete(0, tk.END)
+        if rows:
+            self.listbox.insert(tk.END, *rows)
+        if self.selected is not None and self.offset <= self.selected < self.offset + len(rows):
+            self.listbox.selection_set(self.selected - self.offset)
+        if self.records:
+            self.scrollbar.set(self.offset / len(self.records), (self.offset + len(rows)) / len(self.records))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.records) - self.page_size))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.offset + rows)
+        return "break"
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == tk.MOVETO:
+            self.scroll_to(int(float(amount) * len(self.records)))
+        elif action == tk.SCROLL:
+            self.scroll_by(int(amount) * (self.page_size if unit == tk.PAGES else 1))
+
+    def on_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.offset + selection[0]
+
+    def move_selection(self, step):
+        if not self.records:
+            return "break"
+        self.selected = 0 if self.selected is None else max(0, min(self.selected + step, len(self.records) - 1))
+        if self.selected < self.offset:
+            self.offset = self.selected
+        elif self.selected >= self.offset + self.page_size:
+            self.offset = self.selected - self.page_size + 1
+        self.render()
+        return "break"
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)